@@ -1,5 +1,5 @@
 
-SRC_NODE = [1, 0]
+NODE_ADDRESS = 2
 
 sample_rate = 44100 
 volume = 1.0   
@@ -20,16 +20,23 @@ SLOT_DURATION = 1
 
 EXTRA_END_BITS = 1
 
-CHECK_1 = [0, 0, 1, 1]
-CHECK_2 = [1, 1, 0, 0]
-CHECK_3 = [0, 1, 1, 0]
+HEADER_VERSION = 2
+VERSION_BITS = 2
+COUNT_BITS = 3
+ADDR_BITS = 5
+FRAG_BITS = 4
+LENGTH_BITS = 6
+CHECK_BITS = 4
+
+FRAGMENT_MTU = 32                # Payload bits per frame; longer messages are fragmented (< 2 ** LENGTH_BITS)
+
+BROADCAST_ADDRESS = 0
+NETWORK_NODES = [1, 2, 3]       # Every node address in the space; broadcast ACKs follow this order
+MULTICAST_GROUPS = {}           # group address -> member addresses, e.g. {31: [1, 3]}
 
 RETURN_MESSAGE = [1, 1, 1, 1, 0, 1, 0, 0, 0, 1, 1]
 START_BITS = [0, 0, 0, 0, 0, 1]
 
-END_BITS = [0, 0, 0, 0, 0, 1, 1]
-REC_END_BITS = END_BITS[:-EXTRA_END_BITS]
-
 SENDER_INIT_TIME = 1
 RECEIVER_INIT_TIME = 0.5
 
@@ -38,3 +45,40 @@ ACK_SEND_TIME = 6.4
 
 REC_TIMEOUT = 1.5
 ACK_REC_TIMEOUT = 1.5
+
+INGEST_MODE = 'file'            # 'file', 'fifo' or 'socket'
+INGEST_PATH = 'messages.txt'
+SEND_QUEUE_SIZE = 16
+DEFAULT_PRIORITY = 1
+INGEST_POLL_TIME = 0.2
+
+LOG_FLUSH_INTERVAL = 1.0
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# Number of most recent frames remembered per sender and destination. The sender is stop-and-wait
+# with a counter per destination, so only its current frame can be retransmitted and the next
+# message on a destination always carries a different counter.
+DEDUP_WINDOW = 1
+
+CAPTURE_RING_CHUNKS = 32
+
+CCA_BUSY_SNR_DB = 10            # Band energy above the noise floor that marks the channel busy
+CCA_IDLE_SNR_DB = 6             # ... and the level every band must fall under to mark it idle again
+CCA_IDLE_ALPHA = 0.1            # Noise floor tracking speed while idle
+CCA_BUSY_ALPHA = 0.001          # ... and while busy, to slowly absorb persistent background tones
+
+MODULATION = 'tone'             # 'tone' (phase-reset sine bursts) or 'cpfsk' (continuous phase, shaped)
+PULSE_SHAPE = 'raised_cosine'   # 'raised_cosine' or 'gaussian' frequency transitions in cpfsk mode
+PULSE_ROLLOFF = 0.5             # Raised-cosine transition length, in symbols
+GAUSSIAN_BT = 0.5               # Bandwidth-time product of the Gaussian filter
+DETECT_WINDOW = 'hann'          # Window applied before the detector FFT: 'hann', 'hamming', 'blackman' or None
+
+COLLISION_DETECT = False        # Listen while transmitting and abort the frame on foreign energy
+CD_SNR_DB = 10                  # Foreign band energy above the noise floor ...
+CD_RELATIVE_DB = -25            # ... and relative to our own tone that counts as another transmitter
+CD_CONFIRM_CHUNKS = 2           # Consecutive chunks with foreign energy before aborting
+CD_LATENCY_MARGIN = 0.05        # Slack around the audio latency estimate when matching chunks to our own symbols
+JAM_SYMBOLS = 4                 # Alternating f_1/f_0 symbols played after an abort
+
+PIPELINE_DEPTH = 2              # Frames rendered ahead while the current one contends, plays or waits for its ACK
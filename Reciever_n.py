@@ -1,22 +1,27 @@
 import pyaudio
-import numpy as np
 import time
 
+from collections import deque
 from datetime import datetime
 
-from CONSTANTS import SRC_NODE
-from CONSTANTS import sample_rate, volume, bit_duration, chunk_size
-from CONSTANTS import f_0, f_1, f_d, tolerance
+from CONSTANTS import NODE_ADDRESS
+from CONSTANTS import sample_rate, bit_duration
+from CONSTANTS import f_0, f_1, f_d
 from CONSTANTS import CW_MAX, CW_MIN, SIFS, DIFS, SLOT_DURATION
-from CONSTANTS import RETURN_MESSAGE, REC_END_BITS, EXTRA_END_BITS
-from CONSTANTS import SENDER_INIT_TIME, ACK_SEND_TIME, ACK_SEND_INIT
+from CONSTANTS import RETURN_MESSAGE
 from CONSTANTS import ACK_REC_TIMEOUT, REC_TIMEOUT
-from CONSTANTS import CHECK_1, CHECK_2, CHECK_3
+from CONSTANTS import DEDUP_WINDOW
+
+from logwriter import LogWriter
+from capture import CaptureRing
+from modem import render_signal, detect_frequency, match_frequency
+from header import HEADER_LENGTH, parse_header, recipients, ack_delay
 
 ##########################################################################################
 ##########################################################################################
 
-RECEIVED_SET = set()
+RECEIVED_WINDOWS = {}    # (sender, destination) -> the last DEDUP_WINDOW (counter, fragment) pairs accepted
+REASSEMBLY = {}          # sender address -> (counter, {fragment index: bits}, last fragment index)
 
 ##########################################################################################
 ##########################################################################################
@@ -28,43 +33,16 @@ def get_timestamp():
     timestamp = datetime.now().strftime('%H:%M:%S')
     return timestamp
 
-def decimal_value(length_bits):
-    'Returns the decimal value represented by the given binary list'
-    
-    decimal_value = 0
-    for i, bit in enumerate(reversed(length_bits)):
-        decimal_value += bit * (2 ** i)
-
-    return decimal_value
-
-
 ##########################################################################################
 ##########################################################################################
 
 p_rc = pyaudio.PyAudio()
 p_p = pyaudio.PyAudio()
 
-def generate_tone(frequency, duration, sample_rate):
-    """
-    Generates a sine wave tone of a specified frequency and duration.
-
-    Args:
-        frequency (float): The frequency of the tone in Hertz.
-        duration (float): The duration of the tone in seconds.
-        sample_rate (int): The sample rate in samples per second, used for generating the tone.
-
-    Returns:
-        numpy.ndarray: A NumPy array containing the generated tone as a float32 data type.
-    """
-    
-    t = np.linspace(0, duration, int(sample_rate * duration), False)
-    tone = np.sin(frequency * t * 2 * np.pi) * volume
-    return tone.astype(np.float32)
-
-
 def play_signal(frequencies, durations): 
     """
-    Plays a sequence of audio signals corresponding to a list of frequencies and durations.
+    Plays a sequence of audio signals corresponding to a list of frequencies and durations,
+    rendered as one waveform by the configured MODULATION.
 
     Args:
         frequencies (list): A list of frequencies in Hertz for each tone to be played.
@@ -73,91 +51,65 @@ def play_signal(frequencies, durations):
            
     stream_p = p_p.open(format=pyaudio.paFloat32, channels=1, rate=sample_rate, output=True)
     
-    for frequency, duration in zip(frequencies, durations):
-        tone = generate_tone(frequency, duration, sample_rate)
-        stream_p.write(tone.tobytes())    
+    signal = render_signal(frequencies, durations)
+    stream_p.write(signal.tobytes())    
         
     stream_p.close()
 
 
 ##########################################################################################
 ##########################################################################################
-   
-def detect_frequency(data, sample_rate):
-    """
-    Detects the dominant frequency in an audio signal using the Fast Fourier Transform (FFT).
-
-    Args:
-        data (bytes): Audio signal data, typically in a buffer.
-        sample_rate (int): The sample rate of the audio signal in samples per second.
 
-    Returns:
-        float: The dominant frequency present in the audio signal.
+def already_received(count, frag_index, sender, dest):
     """
+    Checks the (counter, fragment) pair against the sliding window of frames recently accepted from the sender
+    on the given destination (our own address, the broadcast address or a multicast group).
     
-    data = np.frombuffer(data, dtype=np.int16)
-    fft_result = np.fft.fft(data)
-    freqs = np.fft.fftfreq(len(fft_result), 1 / sample_rate)
-    
-    idx = np.argmax(np.abs(fft_result[:len(fft_result)//2])) 
-    peak_freq = abs(freqs[idx])
+    The sender keeps a counter per destination and is stop-and-wait, so consecutive messages on
+    one destination always differ by one and only the frame in flight can be retransmitted. The
+    window only remembers the last DEDUP_WINDOW frames, so memory stays constant however long the
+    node runs.
+    """
     
-    return peak_freq    
+    window = RECEIVED_WINDOWS.setdefault((sender, dest), deque(maxlen=DEDUP_WINDOW))
     
+    if (count, frag_index) in window:
+        return True
     
-def match_frequency(freq):
-    """
-    Matches a detected frequency to predefined frequencies (f_0, f_1, f_d) within a tolerance range.
+    else:
+        window.append((count, frag_index))
+        return False
 
-    Args:
-        freq (float): The detected frequency in Hertz to be matched.
+def reassemble(sender, count, frag_index, last, bits):
     """
+    Stores a fragment and returns the complete message once all of its fragments have arrived.
     
-    if abs(freq - f_0) < tolerance:
-        return 0
-    elif abs(freq - f_1) < tolerance:
-        return 1
-    elif abs(freq - f_d) < tolerance:
-        return 'delimiter'
-    return -1
-
-
-##########################################################################################
-##########################################################################################
-
-def remove_bit_stuffing(message):
-    """Removes the inserted '1' from bit-stuffed message."""
+    The sender transmits one message at a time, so only the latest message per sender is kept;
+    a fragment with a new counter discards any incomplete message from that sender.
     
-    i = 5
-    extra_bits = []
-    while i <= len(message):  
-        if message[i-5 : i] == [0, 0, 0, 0, 1]:
-            extra_bits.append(i - 1)
-            
-        i += 1
+    Returns:
+        list: The reassembled message bits, or None if fragments are still missing.
+    """
     
-    i = 0
-    ret_message = []
-    while i < len(message):
-        if i not in extra_bits:
-            ret_message.append(message[i])
-            
-        i += 1
-            
-    return ret_message
-
-##########################################################################################
-##########################################################################################
-
-def already_received(count_bits, sender_bits):
-    add_bits = tuple(sender_bits + count_bits)
+    if sender not in REASSEMBLY or REASSEMBLY[sender][0] != count:
+        REASSEMBLY[sender] = (count, {}, None)
+        
+    _, fragments, last_index = REASSEMBLY[sender]
+    fragments[frag_index] = bits
+    if last:
+        last_index = frag_index
+        REASSEMBLY[sender] = (count, fragments, last_index)
     
-    if add_bits in RECEIVED_SET:
-        return True
+    if last_index is None or len(fragments) != last_index + 1:
+        return None
     
-    else:
-        RECEIVED_SET.add(add_bits)
-        return False
+    del REASSEMBLY[sender]
+    
+    message = []
+    for i in range(last_index + 1):
+        message.extend(fragments[i])
+        
+    return message
 
 def transmit_rc(message):
     """Transmits an acknowledgment signal based on the given message bits."""
@@ -183,7 +135,7 @@ def receive_messages():
     """Continuously listens for incoming messages, decodes them, and responds if applicable."""
     
     while True:
-        stream_rc = p_rc.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, input=True, frames_per_buffer=chunk_size)
+        rc_reader.discard()     # Drop anything captured while we were transmitting
         
         prev_time = time.time()  # Record the time when listening starts
         error = False  # Flag to indicate if an error occurs during reception
@@ -196,7 +148,7 @@ def receive_messages():
                 error = True
                 break
                 
-            data = stream_rc.read(chunk_size, exception_on_overflow=False)
+            data = rc_reader.read_chunk()
             detected_freq = detect_frequency(data, sample_rate) 
             matched_bit = match_frequency(detected_freq)
             
@@ -219,7 +171,7 @@ def receive_messages():
                 error = True
                 break
             
-            data = stream_rc.read(chunk_size, exception_on_overflow=False)
+            data = rc_reader.read_chunk()
             detected_freq = detect_frequency(data, sample_rate)
             matched_bit = match_frequency(detected_freq)
             
@@ -236,16 +188,19 @@ def receive_messages():
             continue
         
         
-        'Continue reading bits until the auxiliary bits are detected at the end'
-        decoded_bits = []
-        while decoded_bits[-len(REC_END_BITS):] != REC_END_BITS:
+        'Continue reading bits until the header and the payload length it announces have been decoded'
+        frame_bits = [0] * HEADER_LENGTH     # Grown once to the full frame size when the header is parsed
+        received = 0
+        zeros = 0                            # Run of consecutive '0's, used to drop stuffed '1's
+        header = None
+        while received < len(frame_bits):
             
             'Check for a timeout; if it exceeds DIFS, set error flag and break'
             if time.time() - prev_time > REC_TIMEOUT:
                 error = True
                 break
             
-            data = stream_rc.read(chunk_size, exception_on_overflow=False)
+            data = rc_reader.read_chunk()
             detected_freq = detect_frequency(data, sample_rate)
             matched_bit = match_frequency(detected_freq)
             
@@ -257,9 +212,23 @@ def receive_messages():
                 prevBit = matched_bit
                 
                 if prevBit in [0, 1]:
-                    decoded_bits.append(prevBit)
                     print(f"RCV_BIT: {matched_bit}")
                     
+                    if zeros == 4 and prevBit == 1:     # Stuffed bit
+                        zeros = 0
+                        continue
+                    
+                    zeros = zeros + 1 if prevBit == 0 else 0
+                    frame_bits[received] = prevBit
+                    received += 1
+                    
+                    if received == HEADER_LENGTH:
+                        header = parse_header(frame_bits)
+                        if header is None:
+                            break
+                        
+                        frame_bits.extend([0] * header[-1])
+                    
                 elif prevBit == 'delimiter':
                     # print("RCV_DEL")
                     pass
@@ -267,73 +236,55 @@ def receive_messages():
         'Skip the loop if Timeout has occoured' 
         if error:
             continue          
-         
-        stream_rc.close()
-                          
-        if len(decoded_bits) < (11 + len(REC_END_BITS) - EXTRA_END_BITS):
+        
+        # Validate the header and extract the counter, addresses and fragment information
+        if header is None:
+            print("UNIDENTIFIED SENDER")
             continue
-         
-        # Extract sender and receiver bits from the decoded bits
-        count_bits = decoded_bits[:3]
-        check_bits = decoded_bits[3:7]
-        sender_bits = decoded_bits[7:9]  # First two bits are sender ID
-        receiver_bits = decoded_bits[9:11]  # Next two bits are receiver ID
         
-        message_bits = (decoded_bits[11:-len(REC_END_BITS)])  # Extract the actual message bits
-        message_bits = remove_bit_stuffing(message_bits)  # Remove any bit stuffing from the message
+        count, sender, receiver, frag_index, last, length = header
+        fragment_bits = frame_bits[HEADER_LENGTH:]  # Extract the actual message bits
         
-        if sender_bits == [0, 1] and check_bits == CHECK_1:
-            print("RECEIVING FROM 1")
-            
-        elif sender_bits == [1, 0] and check_bits == CHECK_2:
-            print("RECEIVING FROM 2")
-            
-        elif sender_bits == [1, 1] and check_bits == CHECK_3:
-            print("RECEIVING FROM 3")
-            
-        else:
-            print("UNIDENTIFIED SENDER")
+        print(f"RECEIVING FROM {sender}")
+        
+        # ACKs are sent by every addressed node, ordered by its position among the recipients
+        if NODE_ADDRESS not in recipients(sender, receiver):
             continue
         
-        # Check if the receiver bits match the source node
-        if receiver_bits == SRC_NODE:
-            time.sleep(ACK_SEND_INIT)
-            transmit_rc(RETURN_MESSAGE)
-
-         # Check if the receiver bits indicate a broadcast to all nodes
-        elif receiver_bits == [0, 0] and sender_bits != SRC_NODE:
-            if SRC_NODE == [0, 1]:
-                time.sleep(SENDER_INIT_TIME)
-                transmit_rc(RETURN_MESSAGE)
-                
-            elif SRC_NODE == [1, 0]:
-                if sender_bits == [0, 1]:
-                    time.sleep(SENDER_INIT_TIME)
-                    transmit_rc(RETURN_MESSAGE)
-                    
-                elif sender_bits == [1, 1]:
-                    time.sleep(ACK_SEND_TIME)
-                    transmit_rc(RETURN_MESSAGE)   
-                    
-            else:
-                time.sleep(ACK_SEND_TIME)
-                transmit_rc(RETURN_MESSAGE)  
-            
+        time.sleep(ack_delay(NODE_ADDRESS, sender, receiver))
+        transmit_rc(RETURN_MESSAGE)
+        
+        if already_received(count, frag_index, sender, receiver):
+            continue
+        
+        message_bits = reassemble(sender, count, frag_index, last, fragment_bits)
+        if message_bits is None:
+            print(f"FRAGMENT {frag_index} FROM {sender} STORED")
+            continue
         
         timestamp = get_timestamp()
         
-        if (receiver_bits == SRC_NODE or (receiver_bits == [0, 0] and sender_bits != SRC_NODE)) and not already_received(count_bits, sender_bits):
-            with open('receive.txt', 'a') as file:
-                file.write(f"[RECVD]: {message_bits} {decimal_value(sender_bits)} {timestamp}\n")
-                
-            print(f"[RECVD]: {message_bits} {decimal_value(sender_bits)} {timestamp}")
+        RECEIVE_LOG.write(f"[RECVD]: {message_bits} {sender} {timestamp}\n")
+
+        print(f"[RECVD]: {message_bits} {sender} {timestamp}")
             
 
 ##########################################################################################
 ########################################################################################## 
 
-RECEIVED_SET = set()
-receive_messages()
+RECEIVE_LOG = LogWriter('receive.txt')
+
+capture_rc = CaptureRing(p_rc)
+rc_reader = capture_rc.reader()
+capture_rc.start()
+
+try:
+    receive_messages()
+
+finally:
+    # Also reached on Ctrl+C, so the capture metrics are always printed
+    capture_rc.stop()
+    RECEIVE_LOG.close()
 
-p_rc.terminate()
-p_p.terminate()
+    p_rc.terminate()
+    p_p.terminate()
@@ -1,16 +1,24 @@
 import pyaudio
 import numpy as np
 import time
-import random
 from datetime import datetime
 
-from CONSTANTS import SRC_NODE, EXTRA_END_BITS
-from CONSTANTS import sample_rate, volume, bit_duration, chunk_size
-from CONSTANTS import f_0, f_1, f_d, tolerance
-from CONSTANTS import CW_MAX, CW_MIN, SIFS, DIFS, SLOT_DURATION
-from CONSTANTS import RETURN_MESSAGE, START_BITS, END_BITS
-from CONSTANTS import ACK_REC_TIMEOUT, ACK_SEND_TIME, RECEIVER_INIT_TIME
-from CONSTANTS import CHECK_1, CHECK_2, CHECK_3
+from CONSTANTS import NODE_ADDRESS, EXTRA_END_BITS
+from CONSTANTS import sample_rate, bit_duration, chunk_size
+from CONSTANTS import f_0, f_1, f_d
+from CONSTANTS import RETURN_MESSAGE, START_BITS
+from CONSTANTS import ACK_REC_TIMEOUT
+from CONSTANTS import INGEST_MODE, INGEST_PATH
+from CONSTANTS import COLLISION_DETECT, CD_CONFIRM_CHUNKS, CD_LATENCY_MARGIN, JAM_SYMBOLS
+
+from ingest import SendQueue, start_ingest
+from logwriter import LogWriter
+from capture import CaptureRing
+from modem import render_signal, detect_frequency, match_frequency
+from cca import ChannelMonitor
+from mac import csma_process
+from header import build_header, split_fragments, is_group, recipients, ack_delay
+from pipeline import TransmitPipeline
 
 
 
@@ -26,99 +34,83 @@ def get_timestamp():
     timestamp = datetime.now().strftime('%H:%M:%S')
     return timestamp
 
-def decimal_value(length_bits):
-    'Returns the decimal value represented by the given binary list'
-    
-    decimal_value = 0
-    for i, bit in enumerate(reversed(length_bits)):
-        decimal_value += bit * (2 ** i)
-
-    return decimal_value
-
 ##########################################################################################
 ##########################################################################################
 
 p_cs = pyaudio.PyAudio()
-p_ack = pyaudio.PyAudio()
 p_p = pyaudio.PyAudio()
 
-def generate_tone(frequency, duration, sample_rate):
+def play_signal(signal): 
     """
-    Generates a sine wave tone of a specified frequency and duration.
+    Plays an already rendered waveform on the output stream, which stays open between frames.
 
     Args:
-        frequency (float): The frequency of the tone in Hertz.
-        duration (float): The duration of the tone in seconds.
-        sample_rate (int): The sample rate in samples per second, used for generating the tone.
-
-    Returns:
-        numpy.ndarray: A NumPy array containing the generated tone as a float32 data type.
+        signal (numpy.ndarray): The float32 waveform to be played.
     """
-    
-    t = np.linspace(0, duration, int(sample_rate * duration), False)
-    tone = np.sin(frequency * t * 2 * np.pi) * volume
-    return tone.astype(np.float32)
-
+           
+    stream_p.write(signal.tobytes())    
 
-def play_signal(frequencies, durations): 
-    """
-    Plays a sequence of audio signals corresponding to a list of frequencies and durations.
 
-    Args:
-        frequencies (list): A list of frequencies in Hertz for each tone to be played.
-        durations (list): A list of durations in seconds corresponding to each frequency.
+def transmit_frame(frame):
     """
-           
-    stream_p = p_p.open(format=pyaudio.paFloat32, channels=1, rate=sample_rate, output=True)
+    Plays a prepared frame. With COLLISION_DETECT the node listens while talking: after every symbol the
+    chunks captured so far are checked for energy in tone bands we were not playing, and the
+    frame is cut short with a jam pattern once a collision is confirmed.
     
-    for frequency, duration in zip(frequencies, durations):
-        tone = generate_tone(frequency, duration, sample_rate)
-        stream_p.write(tone.tobytes())    
-        
-    stream_p.close()
-    
-    
-##########################################################################################
-##########################################################################################
-   
-def detect_frequency(data, sample_rate):
-    """
-    Detects the dominant frequency in an audio signal using the Fast Fourier Transform (FFT).
-
-    Args:
-        data (bytes): Audio signal data, typically in a buffer.
-        sample_rate (int): The sample rate of the audio signal in samples per second.
+    A blocking write returns while audio is still queued for the speaker, and the microphone adds
+    its own delay, so each chunk is compared with the symbols that were actually audible when it
+    was captured: the frame becomes audible one output latency after it is written, and chunk
+    capture times already account for the input latency.
 
     Returns:
-        float: The dominant frequency present in the audio signal.
+        bool: True if the transmission was aborted because of a collision, False otherwise.
     """
     
-    data = np.frombuffer(data, dtype=np.int16)
-    fft_result = np.fft.fft(data)
-    freqs = np.fft.fftfreq(len(fft_result), 1 / sample_rate)
+    if not COLLISION_DETECT:
+        play_signal(frame.signal)
+        return False
+    
+    band_of = {f_0: 0, f_1: 1, f_d: 2}
+    bounds = frame.bounds
+    times = bounds / sample_rate    # Symbol boundaries in seconds from the start of the frame
     
-    idx = np.argmax(np.abs(fft_result[:len(fft_result)//2])) 
-    peak_freq = abs(freqs[idx])
+    lwt_reader = capture_cs.reader()
     
-    return peak_freq    
+    try:
+        audible = time.time() + stream_p.get_output_latency()   # When the first sample leaves the speaker
+        foreign_chunks = 0
+        for k in range(len(frame.frequencies)):
+            play_signal(frame.signal[bounds[k]:bounds[k + 1]])
+            
+            data = lwt_reader.read_chunk(timeout=0)
+            while data is not None:
+                # Our own symbols that may be heard in this chunk
+                start = lwt_reader.captured_at - audible - CD_LATENCY_MARGIN
+                end = lwt_reader.captured_at + chunk_size / sample_rate - audible + CD_LATENCY_MARGIN
+                own = [band_of[frame.frequencies[i]] for i in range(len(frame.frequencies))
+                       if times[i] < end and times[i + 1] > start]
+                
+                if not own:
+                    pass    # Captured before our frame could be heard
+                elif CCA.foreign_energy(data, own):
+                    foreign_chunks += 1
+                else:
+                    foreign_chunks = 0
+                    
+                if foreign_chunks >= CD_CONFIRM_CHUNKS:
+                    print(f"COLLISION DETECTED AFTER {k + 1}/{len(frame.frequencies)} SYMBOLS | JAMMING")
+                    if len(JAM_SIGNAL):
+                        play_signal(JAM_SIGNAL)
+                    return True
+                
+                data = lwt_reader.read_chunk(timeout=0)
+                
+        return False
     
+    finally:
+        capture_cs.release(lwt_reader)
     
-def match_frequency(freq):
-    """
-    Matches a detected frequency to predefined frequencies (f_0, f_1, f_d) within a tolerance range.
-
-    Args:
-        freq (float): The detected frequency in Hertz to be matched.
-    """
     
-    if abs(freq - f_0) < tolerance:
-        return 0
-    elif abs(freq - f_1) < tolerance:
-        return 1
-    elif abs(freq - f_d) < tolerance:
-        return 'delimiter'
-    return -1
-
 ##########################################################################################
 ##########################################################################################
 
@@ -133,7 +125,21 @@ def receive_ack():
 
     print("Receiving Acknowledgement")
     
-    stream_ack = p_ack.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, input=True, frames_per_buffer=chunk_size)
+    # A fresh reader starts at the latest chunk, dropping what was captured while our own frame was playing
+    ack_reader = capture_cs.reader()
+    try:
+        return decode_ack(ack_reader)
+    finally:
+        capture_cs.release(ack_reader)
+
+
+def decode_ack(ack_reader):
+    """
+    Decodes the acknowledgement bits from the given capture ring reader.
+
+    Returns:
+        bool: True if the acknowledgment message matches the expected bits, False otherwise.
+    """
     
     prev_time = time.time()     # Record the initial time to check timeouts
     
@@ -145,7 +151,7 @@ def receive_ack():
         if time.time() - prev_time > ACK_REC_TIMEOUT:
             return False
         
-        data = stream_ack.read(chunk_size, exception_on_overflow=False)
+        data = ack_reader.read_chunk()
         detected_freq = detect_frequency(data, sample_rate)
         matched_bit = match_frequency(detected_freq)
         
@@ -165,7 +171,7 @@ def receive_ack():
         if time.time() - prev_time > ACK_REC_TIMEOUT:
             return False
         
-        data = stream_ack.read(chunk_size, exception_on_overflow=False)
+        data = ack_reader.read_chunk()
         detected_freq = detect_frequency(data, sample_rate)
         matched_bit = match_frequency(detected_freq)
         
@@ -185,7 +191,7 @@ def receive_ack():
         if time.time() - prev_time > ACK_REC_TIMEOUT:
             return False
         
-        data = stream_ack.read(chunk_size, exception_on_overflow=False)
+        data = ack_reader.read_chunk()
         detected_freq = detect_frequency(data, sample_rate)
         matched_bit = match_frequency(detected_freq)
         
@@ -205,8 +211,6 @@ def receive_ack():
                 pass
             
     
-    stream_ack.close()
-    
     if decoded_bits == RETURN_MESSAGE[5:-EXTRA_END_BITS]:
         'Return true if the decoded bits match the Acknowledgement with preamble removed'
         return True
@@ -220,26 +224,16 @@ def receive_ack():
 
 def carrier_sense(): 
     """
-    Performs carrier sensing to check if the communication channel is busy by analyzing the frequency of incoming data.
+    Performs carrier sensing to check if the communication channel is busy.
     
-    Reads audio data from the input stream, detects the frequency, and matches it to [f_0, f_1, or delimiter] to determine
-    if a signal is present.
+    Queries the background clear channel assessment, which compares the energy in the
+    [f_0, f_1, delimiter] bands with their adaptive noise floors, so it never blocks.
     
     Returns:
         bool: True if a signal (carrier) is detected on the channel, False otherwise.
     """
     
-    stream_cs = p_cs.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, input=True, frames_per_buffer=chunk_size)
-    data = stream_cs.read(chunk_size, exception_on_overflow=False)
-    stream_cs.close()
-    
-    detected_freq = detect_frequency(data, sample_rate)
-    matched_bit = match_frequency(detected_freq)
-    
-    if matched_bit in [0, 1, 'delimiter']:
-        return True
-                
-    return False
+    return CCA.busy
 
 
 def sense_time(t):
@@ -254,143 +248,72 @@ def sense_time(t):
         bool: True immediately if a collision occurs within the time period, False otherwise.
     """
     
-    collision = False
-            
-    start_time = time.time()
-    while time.time() - start_time < t:
-        if carrier_sense():
-            collision = True
-            break
-            
-    return collision
+    return CCA.wait_busy(t)
         
 
-def csma_transmit(message, dest):
+def csma_transmit(frame):
     """
-    Transmits a message using the CSMA/CA protocol with carrier sensing and collision avoidance.
+    Transmits a frame using the CSMA/CA protocol with carrier sensing and collision avoidance.
     
     The function senses the medium for availability, performs a random backoff, and transmits 
-    the message. It listens for acknowledgment (ACK) from the destination to confirm successful transmission.
+    the frame. It listens for acknowledgment (ACK) from the destination to confirm successful transmission.
+    The decisions are taken by mac.csma_process; this function performs its actions on the audio channel.
     
     Args:
-        message (list): The message to be transmitted, represented as a list of bits (0s and 1s).
-        dest (list): The destination address (if [0, 0], it indicates multiple recipients).
+        frame (PreparedFrame): The frame to be transmitted, with its waveform already rendered
+                               by the transmit pipeline.
     
     Returns:
         str: A timestamp of when the message was successfully transmitted, if acknowledged.
     """
     
-    global MESSAGE_COUNT
-    
-    send_message = add_count(message, MESSAGE_COUNT)
-    send_message = add_start_end(send_message)
-    contention_window = CW_MIN  # Start with the minimum contention window size
+    ack_delays = {node: ack_delay(node, NODE_ADDRESS, frame.dest) for node in recipients(NODE_ADDRESS, frame.dest)}
+    mac = csma_process(ack_delays, is_group(frame.dest))
     
-    ack1 = False
-    ack2 = False
-    
-    # Continuously attempt to transmit the message until successful
+    result = None
+    frame_end = None
     while True:
+        try:
+            action = mac.send(result)
+        except StopIteration:
+            break
         
-        'Step 1: Perform carrier sensing to check if the medium is free'
-        if not carrier_sense():
+        result = None
+        if action[0] == 'carrier_sense':
+            result = carrier_sense()
             
-            'Step 2: If the medium is free, sense the medium for DIFS duration'
-            if sense_time(DIFS):
-                continue    # If busy during DIFS, restart the process
+        elif action[0] == 'sense':
+            result = sense_time(action[1])
             
-            'Step 3: Perform random backoff if medium is free after DIFS'
-            backoff_time_slots = random.randint(0, contention_window)
-            print(f"DIFS-pass | Backoff Slots: {backoff_time_slots}")
-                  
-            # Count down the backoff time slots while continuously checking the medium  
-            while backoff_time_slots > 0:      
-                if not sense_time(SLOT_DURATION):
-                    backoff_time_slots -= 1                    
-                    
-                else:     
-                    pass
-                    
-            
-            print("[DIFS + SLOTS]-pass")
-            
-            'Step 4: Sense the medium for SIFS (Short Inter-frame Space) duration before transmitting'
-            if sense_time(SIFS):
-                contention_window *= 2
-                
-                if contention_window > CW_MAX:
-                    contention_window = CW_MIN  # Reset contention window if it exceeds maximum
-
-                print(f"MEDIUM BUSY | WHEN READY TO TRANSMIT | CW = {contention_window}")                        
-                continue    # Go back and retry
-            
-            
-            'Step 5: Construct the signal (frequencies and durations) for the message transmission'
-            frequencies = []
-            durations = []
-            for bit in send_message:
-                if bit == 1:
-                    frequencies.append(f_1)
-                else:
-                    frequencies.append(f_0)
-                
-                durations.append(bit_duration)
-                frequencies.append(f_d)  
-                durations.append(bit_duration)
-                        
-            play_signal(frequencies, durations)
-            
-            
-            # Get the current timestamp when the message is transmitted
+        elif action[0] == 'sense_difs':
+            # Time the channel has already been idle counts towards DIFS
+            result = sense_time(action[1] - CCA.idle_time())
             
+        elif action[0] == 'wait_idle':
+            CCA.wait_idle()
             
-            'Step 6: Wait for SIFS duration before checking for acknowledgment (ACK)'
-            # time.sleep(SIFS)
-            if dest != [0, 0]:  # If single destination
-                ack = False
-                ack = receive_ack()
+        elif action[0] == 'transmit':
+            result = transmit_frame(frame)
+            frame_end = time.time()
             
-                if ack:
-                    timestamp = get_timestamp()
-                    return timestamp
-                
-                else:
-                    print("ACK not recieved") 
-                        
-            else:               # If broadcasting
-                if ack1:
-                    time.sleep(ACK_SEND_TIME)
-                else:
-                    ack1 = receive_ack()    # Receive ACK from the first destination
-                
-                time.sleep(RECEIVER_INIT_TIME)
-                
-                if not ack2:
-                    ack2 = receive_ack()    # Receive ACK from the second destination
-                else:
-                    time.sleep(ACK_SEND_TIME)
-                    
-                    
-                if ack1 and ack2:       # Check if both ACKs are received
-                    timestamp = get_timestamp()
-                    return timestamp
-                
-                else:
-                    print(f"ACK1: {ack1} and ACK2: {ack2} not received") 
-               
-        else:
-            pass
+        elif action[0] == 'receive_ack':
+            # Wait for the ACK slot, measured from the end of the frame rather than the previous slot
+            time.sleep(max(0, frame_end + action[2] - time.time()))
+            result = receive_ack()
+    
+    # Get the current timestamp when the message is acknowledged
+    timestamp = get_timestamp()
+    return timestamp
                 
 ##########################################################################################
 ##########################################################################################
 
-def add_start_end(message):
-    """Adds start and end bit sequences to the message."""
+def add_start(message):
+    """Adds the start bit sequence to the message. The header length field marks the end of the frame."""
     
     final_message = []
     final_message.extend(START_BITS)
     final_message.extend(message)
-    final_message.extend(END_BITS)
 
     return final_message
 
@@ -433,87 +356,97 @@ def remove_bit_stuffing(message):
     return ret_message
 
 
-def add_header(message, dest):
-    """Adds a header containing source and destination node information to the message."""
+def add_header(message, dest, cnt, frag_index, last):
+    """Adds the versioned header (counter, addresses, fragment, length and check bits) to the message."""
     
-    ret_message = []
-    
-    if SRC_NODE == [0, 1]:
-        ret_message.extend(CHECK_1)
-        
-    elif SRC_NODE == [1, 0]:
-        ret_message.extend(CHECK_2)
-        
-    elif SRC_NODE == [1, 1]:
-        ret_message.extend(CHECK_3)
-        
-    ret_message.extend(SRC_NODE)
-    ret_message.extend(dest)
+    ret_message = build_header(cnt, NODE_ADDRESS, dest, frag_index, last, len(message))
     ret_message.extend(message)
     
     return ret_message
-
-def add_count(message, cnt):
-    
-    binary_number = bin(cnt)[2:].zfill(3) 
-    binary_list = [int(bit) for bit in binary_number]    
-    new_list = binary_list + message
     
-    return new_list
-    
-def transform_message(message, dest):
-    """Applies header, bit stuffing, and start/end bits to the message."""
-    ret_message = (add_header(bit_stuff(message), dest))
+def transform_message(message, dest, cnt, frag_index=0, last=True):
+    """Applies the header and bit stuffing to a message fragment."""
+    ret_message = bit_stuff(add_header(message, dest, cnt, frag_index, last))
     return ret_message
 
 ##########################################################################################
 ##########################################################################################
 
-def read_message_file(file_path):
-    """Reads a message file and returns a list of destination-message pairs as binary lists."""
+def build_frames(dest, message):
+    """
+    Assigns the message counter and builds the on-air bits of every fragment of a message.
+    Runs in the transmit pipeline worker, ahead of the MAC.
     
-    pairs = []
-    with open(file_path, 'r') as file:
-        for line in file:
-            message, dest = line.strip().split()
-            
-            message_bits = [int(bit) for bit in message]
-            
-            if dest == '-1':
-                pairs.append((-1, message_bits))
-            
-            else:
-                dest_binary = [int(bit) for bit in format(int(dest), '02b')]
-                pairs.append((dest_binary, message_bits))
-                        
-    return pairs
+    Every destination has its own counter, so the frames a receiver accepts on that destination
+    always advance the counter by exactly one, however many messages go elsewhere in between.
+    
+    Returns:
+        list: (frag_index, last, frame_bits) for each fragment, or an empty list if the message is skipped.
+    """
+    
+    if dest == -1:
+        return []
+    
+    MESSAGE_COUNTS[dest] = MESSAGE_COUNTS.get(dest, 0) + 1
+    
+    # Every fragment is acknowledged on its own, so a lost fragment only costs its own retransmission
+    frames = []
+    for frag_index, last, fragment in split_fragments(message):
+        frame_bits = add_start(transform_message(fragment, dest, MESSAGE_COUNTS[dest], frag_index, last))
+        frames.append((frag_index, last, frame_bits))
+        
+    return frames
 
-def process_messages(pairs):
-    """Processes each destination-message pair by transmitting the message and printing the timestamp."""
+def process_messages(pipeline):
+    """Transmits the frames prepared by the pipeline, printing the timestamp of every sent message."""
 
-    for dest, message in pairs:
+    while True:
+        
+        frame = pipeline.get()
+        if frame is None:
+            break
+        
+        timeStamp = csma_transmit(frame)
+        pipeline.release(frame)
         
-        input("Press Enter to continue...")
-        global MESSAGE_COUNT
-        MESSAGE_COUNT += 1
-        if dest != -1:
-            timeStamp = csma_transmit(transform_message(message, dest), dest)  
-            with open('send.txt', 'a') as file:
-                file.write(f"[SENT]: {message} {decimal_value(dest)} {timeStamp}\n")              
-                print(f"[SENT]: {message} {decimal_value(dest)} {timeStamp}")
+        if frame.fragments > 1:
+            print(f"FRAGMENT {frame.frag_index + 1}/{frame.fragments} ACKED")
+            
+        if frame.last:
+            SEND_LOG.write(f"[SENT]: {frame.message} {frame.dest} {timeStamp}\n")
+            print(f"[SENT]: {frame.message} {frame.dest} {timeStamp}")
        
 
 ##########################################################################################
 ########################################################################################## 
 
 
-MESSAGE_COUNT = 0
+MESSAGE_COUNTS = {}     # destination address -> counter of the last message sent to it
+SEND_LOG = LogWriter('send.txt')
+
+capture_cs = CaptureRing(p_cs)
+CCA = ChannelMonitor(capture_cs)
+capture_cs.start()
+CCA.start()
+
+stream_p = p_p.open(format=pyaudio.paFloat32, channels=1, rate=sample_rate, output=True)
+jam = [f_1 if i % 2 == 0 else f_0 for i in range(JAM_SYMBOLS)]
+JAM_SIGNAL = render_signal(jam, [bit_duration] * len(jam)) if jam else np.zeros(0, dtype=np.float32)
 
-file_path = "messages.txt"  
-message_pairs = read_message_file(file_path)
+send_queue = SendQueue()
+start_ingest(INGEST_MODE, INGEST_PATH, send_queue)
 
-process_messages(message_pairs)
+pipeline = TransmitPipeline(send_queue, build_frames)
+pipeline.start()
+
+try:
+    process_messages(pipeline)
+
+finally:
+    # Also reached on Ctrl+C, so the capture metrics are always printed
+    stream_p.close()
+    capture_cs.stop()
+    SEND_LOG.close()
 
-p_p.terminate()
-p_ack.terminate()
-p_cs.terminate()
+    p_p.terminate()
+    p_cs.terminate()
@@ -0,0 +1,171 @@
+import threading
+import time
+import pyaudio
+import numpy as np
+
+from CONSTANTS import sample_rate, chunk_size, CAPTURE_RING_CHUNKS
+
+
+##########################################################################################
+##########################################################################################
+
+class CaptureRing:
+    """
+    Captures microphone input from the PyAudio callback thread into a preallocated ring buffer.
+
+    The ring holds CAPTURE_RING_CHUNKS chunks of chunk_size int16 samples. Decoding happens
+    in the caller's thread through RingReader objects, which return zero-copy views of
+    whole chunks, so a slow detect_frequency() or print() only delays decoding instead of
+    dropping samples at the sound card.
+
+    Metrics (see metrics(), printed when the capture stops):
+        high_water (int): The largest number of unread chunks seen by any reader.
+        input_overflows (int): Number of callbacks in which PortAudio reported lost input.
+        overruns (int): Chunks skipped by all readers, including released ones, after falling a
+                        whole ring behind.
+    """
+
+    def __init__(self, p, chunks=CAPTURE_RING_CHUNKS):
+        self.chunks = chunks
+        self.capacity = chunks * chunk_size
+        self.buffer = np.zeros(self.capacity, dtype=np.int16)
+
+        self.written = 0            # Total samples written since start()
+        self.input_latency = 0.0
+        self._clock = (0, time.time())  # (samples written, wall-clock capture time of the last of them)
+        self.high_water = 0
+        self.input_overflows = 0
+        self.overruns = 0
+
+        self._readers = []
+        self._cond = threading.Condition()
+        self._p = p
+        self._stream = None
+
+    def start(self):
+        """Opens the input stream in callback mode and starts capturing."""
+
+        self._stream = self._p.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, input=True,
+                                    frames_per_buffer=chunk_size, stream_callback=self._callback)
+        self.input_latency = self._stream.get_input_latency()
+        self._stream.start_stream()
+
+    def stop(self):
+        """Stops capturing and prints the capture metrics."""
+
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+
+        metrics = self.metrics()
+        print(f"CAPTURE | High water {metrics['high_water']}/{self.chunks} chunks | "
+              f"Input overflows {metrics['input_overflows']} | Chunks skipped {metrics['overruns']}")
+
+    def metrics(self):
+        """Returns the capture metrics as a dict."""
+
+        with self._cond:
+            return {
+                'high_water': self.high_water,
+                'input_overflows': self.input_overflows,
+                'overruns': self.overruns,
+            }
+
+    def chunk_time(self, index):
+        """Returns the wall-clock time at which the first sample of the given chunk reached the microphone."""
+
+        written, captured = self._clock
+        return captured - (written - index * chunk_size) / sample_rate
+
+    def reader(self):
+        """Returns a new reader positioned at the latest captured chunk boundary."""
+
+        with self._cond:
+            reader = RingReader(self, self.written // chunk_size)
+            self._readers.append(reader)
+            return reader
+
+    def release(self, reader):
+        """Detaches a reader that is no longer used."""
+
+        with self._cond:
+            self._readers.remove(reader)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        now = time.time()
+        samples = np.frombuffer(in_data, dtype=np.int16)
+
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+
+        start = self.written % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:len(samples) - first] = samples[first:]
+
+        with self._cond:
+            self.written += len(samples)
+            self._clock = (self.written, now - self.input_latency)
+            available = self.written // chunk_size
+            for reader in self._readers:
+                self.high_water = max(self.high_water, available - reader.position)
+            self._cond.notify_all()
+
+        return (None, pyaudio.paContinue)
+
+
+class RingReader:
+    """
+    An independent read cursor over a CaptureRing.
+
+    If the reader falls more than the ring size behind the capture thread, the oldest
+    unread chunks are skipped and counted in `overruns`.
+    """
+
+    def __init__(self, ring, position):
+        self.ring = ring
+        self.position = position    # Index of the next chunk to return
+        self.overruns = 0
+        self.captured_at = None     # Wall-clock capture time of the chunk returned last
+
+    def read_chunk(self, timeout=None):
+        """
+        Blocks until the next chunk is captured and returns it.
+
+        Returns:
+            numpy.ndarray: A zero-copy int16 view of chunk_size samples, valid until the capture
+                           thread wraps around the ring, or None if the timeout expired.
+        """
+
+        ring = self.ring
+        with ring._cond:
+            if not ring._cond.wait_for(lambda: ring.written // chunk_size > self.position, timeout):
+                return None
+
+            available = ring.written // chunk_size
+            # Keep one chunk of slack since the callback may be writing the oldest slot
+            if available - self.position > ring.chunks - 1:
+                skipped = available - self.position - (ring.chunks - 1)
+                self.overruns += skipped
+                ring.overruns += skipped
+                self.position += skipped
+                print(f"CAPTURE | Overrun, skipped {skipped} chunks (total {self.overruns})")
+
+            start = (self.position % ring.chunks) * chunk_size
+            self.captured_at = ring.chunk_time(self.position)
+            self.position += 1
+
+        return ring.buffer[start:start + chunk_size]
+
+    def discard(self):
+        """Skips every chunk captured so far, so the next read returns fresh input."""
+
+        with self.ring._cond:
+            self.position = self.ring.written // chunk_size
+
+    def pending(self):
+        """Returns the number of captured chunks not yet read."""
+
+        with self.ring._cond:
+            return self.ring.written // chunk_size - self.position
@@ -0,0 +1,128 @@
+import threading
+import time
+import numpy as np
+
+from CONSTANTS import sample_rate, chunk_size
+from CONSTANTS import f_0, f_1, f_d, tolerance
+from CONSTANTS import CCA_BUSY_SNR_DB, CCA_IDLE_SNR_DB, CCA_IDLE_ALPHA, CCA_BUSY_ALPHA
+from CONSTANTS import CD_SNR_DB, CD_RELATIVE_DB
+
+from modem import detect_window
+
+
+##########################################################################################
+##########################################################################################
+
+class ChannelMonitor:
+    """
+    Continuous clear channel assessment running on its own reader of the capture ring.
+
+    For every captured chunk the energy in each tone band (f_0, f_1, f_d +/- tolerance) is
+    compared with a per-band noise floor estimate. The channel turns busy when any band rises
+    CCA_BUSY_SNR_DB above its floor and only turns idle again once every band is back under
+    CCA_IDLE_SNR_DB. The floor tracks the idle channel quickly and the busy channel slowly, so a
+    constant background tone is eventually absorbed into the floor instead of blocking the node.
+    """
+
+    def __init__(self, ring):
+        self.reader = ring.reader()
+
+        freqs = np.fft.rfftfreq(chunk_size, 1 / sample_rate)
+        self.bands = [np.abs(freqs - f) < tolerance for f in [f_0, f_1, f_d]]
+        self.window = detect_window(chunk_size)
+        self.noise_floor = None
+
+        self.busy = False
+        self.last_transition = time.time()
+
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def since_transition(self):
+        """Returns the number of seconds since the channel last changed between busy and idle."""
+
+        return time.time() - self.last_transition
+
+    def idle_time(self):
+        """Returns how long the channel has been idle, or 0 if it is busy."""
+
+        with self._cond:
+            return 0 if self.busy else self.since_transition()
+
+    def wait_busy(self, t):
+        """
+        Waits up to t seconds for the channel to become busy.
+
+        Returns:
+            bool: True as soon as the channel is (or becomes) busy, False if it stayed idle for t seconds.
+        """
+
+        with self._cond:
+            return self._cond.wait_for(lambda: self.busy, max(t, 0))
+
+    def wait_idle(self):
+        """Blocks while the channel is busy."""
+
+        with self._cond:
+            self._cond.wait_for(lambda: not self.busy)
+
+    def foreign_energy(self, data, own_bands):
+        """
+        Checks a chunk captured while transmitting for energy from another transmitter.
+
+        Args:
+            data (numpy.ndarray): The captured chunk.
+            own_bands (list): Indices (0: f_0, 1: f_1, 2: f_d) of the tones we were playing.
+
+        Returns:
+            bool: True if a band we were not playing is CD_SNR_DB above its noise floor and
+                  within CD_RELATIVE_DB of our own strongest band.
+        """
+
+        noise_floor = self.noise_floor
+        if noise_floor is None:
+            return False
+
+        energy = self._band_energy(data) + 1e-9
+        snr = 10 * np.log10(energy / noise_floor)
+        own = max(energy[b] for b in own_bands)
+
+        for b in range(len(self.bands)):
+            if b not in own_bands and snr[b] > CD_SNR_DB and 10 * np.log10(energy[b] / own) > CD_RELATIVE_DB:
+                return True
+
+        return False
+
+    def _band_energy(self, data):
+        if self.window is not None:
+            data = data * self.window
+
+        spectrum = np.abs(np.fft.rfft(data)) ** 2
+        return np.array([spectrum[band].sum() for band in self.bands])
+
+    def _run(self):
+        while True:
+            energy = self._band_energy(self.reader.read_chunk())
+
+            if self.noise_floor is None:
+                self.noise_floor = energy + 1e-9
+                continue
+
+            snr = 10 * np.log10((energy + 1e-9) / self.noise_floor)
+
+            if self.busy:
+                busy = bool(np.any(snr > CCA_IDLE_SNR_DB))
+            else:
+                busy = bool(np.any(snr > CCA_BUSY_SNR_DB))
+
+            alpha = CCA_BUSY_ALPHA if busy else CCA_IDLE_ALPHA
+            self.noise_floor = (1 - alpha) * self.noise_floor + alpha * (energy + 1e-9)
+
+            if busy != self.busy:
+                with self._cond:
+                    self.busy = busy
+                    self.last_transition = time.time()
+                    self._cond.notify_all()
@@ -0,0 +1,167 @@
+from CONSTANTS import HEADER_VERSION, VERSION_BITS, COUNT_BITS, ADDR_BITS, CHECK_BITS
+from CONSTANTS import FRAG_BITS, LENGTH_BITS, FRAGMENT_MTU
+from CONSTANTS import BROADCAST_ADDRESS, NETWORK_NODES, MULTICAST_GROUPS
+from CONSTANTS import ACK_SEND_INIT, SENDER_INIT_TIME, ACK_SEND_TIME
+
+
+HEADER_LENGTH = VERSION_BITS + COUNT_BITS + 2 * ADDR_BITS + FRAG_BITS + 1 + LENGTH_BITS + CHECK_BITS
+
+MAX_MESSAGE_BITS = FRAGMENT_MTU * (2 ** FRAG_BITS)
+
+CHECK_POLY = [1, 0, 0, 1, 1]    # x^4 + x + 1
+
+##########################################################################################
+##########################################################################################
+
+def to_bits(value, width):
+    """Returns the binary list of the given width representing value."""
+
+    return [int(bit) for bit in format(value, f'0{width}b')]
+
+def from_bits(bits):
+    """Returns the decimal value represented by the given binary list."""
+
+    value = 0
+    for bit in bits:
+        value = value * 2 + bit
+
+    return value
+
+def header_check(bits):
+    """
+    Computes the CRC-4 check bits over the header fields, replacing the per-node CHECK tables.
+
+    Args:
+        bits (list): The header bits preceding the check field.
+
+    Returns:
+        list: CHECK_BITS bits of the polynomial division remainder.
+    """
+
+    remainder = list(bits) + [0] * CHECK_BITS
+    for i in range(len(bits)):
+        if remainder[i] == 1:
+            for j, poly_bit in enumerate(CHECK_POLY):
+                remainder[i + j] ^= poly_bit
+
+    return remainder[-CHECK_BITS:]
+
+##########################################################################################
+##########################################################################################
+
+def build_header(count, src, dest, frag_index, last, length):
+    """
+    Builds the header: version | count | source | destination | fragment | last | length | check.
+
+    Args:
+        count (int): The message counter, wrapped to COUNT_BITS. Shared by all fragments of a message.
+        src (int): The address of the transmitting node.
+        dest (int): A node, multicast group or BROADCAST_ADDRESS.
+        frag_index (int): The position of this fragment within the message.
+        last (bool): True for the final fragment of the message.
+        length (int): The number of payload bits following the header, before bit stuffing.
+
+    Returns:
+        list: HEADER_LENGTH header bits.
+    """
+
+    bits = to_bits(HEADER_VERSION, VERSION_BITS)
+    bits.extend(to_bits(count % (2 ** COUNT_BITS), COUNT_BITS))
+    bits.extend(to_bits(src, ADDR_BITS))
+    bits.extend(to_bits(dest, ADDR_BITS))
+    bits.extend(to_bits(frag_index, FRAG_BITS))
+    bits.append(1 if last else 0)
+    bits.extend(to_bits(length, LENGTH_BITS))
+    bits.extend(header_check(bits))
+
+    return bits
+
+def parse_header(bits):
+    """
+    Parses and validates the header at the start of a received frame.
+
+    Args:
+        bits (list): The decoded (unstuffed) frame bits.
+
+    Returns:
+        tuple: (count, src, dest, frag_index, last, length), or None if the frame is too short,
+               uses another header version, fails the check, announces a payload larger than
+               FRAGMENT_MTU or comes from an address outside NETWORK_NODES.
+    """
+
+    if len(bits) < HEADER_LENGTH:
+        return None
+
+    i = 0
+    version = from_bits(bits[i:i + VERSION_BITS]); i += VERSION_BITS
+    count = from_bits(bits[i:i + COUNT_BITS]); i += COUNT_BITS
+    src = from_bits(bits[i:i + ADDR_BITS]); i += ADDR_BITS
+    dest = from_bits(bits[i:i + ADDR_BITS]); i += ADDR_BITS
+    frag_index = from_bits(bits[i:i + FRAG_BITS]); i += FRAG_BITS
+    last = bits[i] == 1; i += 1
+    length = from_bits(bits[i:i + LENGTH_BITS]); i += LENGTH_BITS
+    check = bits[i:i + CHECK_BITS]
+
+    if version != HEADER_VERSION:
+        return None
+
+    if check != header_check(bits[:i]) or src not in NETWORK_NODES:
+        return None
+
+    if length > FRAGMENT_MTU:
+        return None
+
+    return (count, src, dest, frag_index, last, length)
+
+def split_fragments(message):
+    """
+    Splits a message into fragments of at most FRAGMENT_MTU bits.
+
+    Returns:
+        list: (frag_index, last, fragment_bits) tuples in transmission order.
+    """
+
+    pieces = [message[i:i + FRAGMENT_MTU] for i in range(0, len(message), FRAGMENT_MTU)] or [[]]
+    return [(i, i == len(pieces) - 1, piece) for i, piece in enumerate(pieces)]
+
+##########################################################################################
+##########################################################################################
+
+def is_group(dest):
+    """Returns True if dest is the broadcast address or a multicast group."""
+
+    return dest == BROADCAST_ADDRESS or dest in MULTICAST_GROUPS
+
+def recipients(src, dest, nodes=NETWORK_NODES):
+    """
+    Returns the nodes expected to receive and acknowledge a frame, in ACK order.
+
+    Broadcast frames go to every node in `nodes` (NETWORK_NODES by default), multicast frames to
+    the members of the group; the sender itself is never a recipient. ACKs are sent in ascending
+    address order.
+    """
+
+    if dest == BROADCAST_ADDRESS:
+        members = nodes
+
+    elif dest in MULTICAST_GROUPS:
+        members = MULTICAST_GROUPS[dest]
+
+    else:
+        members = [dest]
+
+    return sorted(node for node in members if node != src)
+
+def ack_delay(node, src, dest, nodes=NETWORK_NODES):
+    """
+    Returns how long a recipient waits after the frame ends before sending its ACK.
+
+    For group frames the k-th recipient (in recipients() order) waits
+    SENDER_INIT_TIME + k * (ACK_SEND_TIME - SENDER_INIT_TIME), so ACKs never overlap.
+    """
+
+    if not is_group(dest):
+        return ACK_SEND_INIT
+
+    rank = recipients(src, dest, nodes).index(node)
+    return SENDER_INIT_TIME + rank * (ACK_SEND_TIME - SENDER_INIT_TIME)
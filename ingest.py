@@ -0,0 +1,272 @@
+import os
+import stat
+import socket
+import threading
+import time
+import queue
+import itertools
+
+from CONSTANTS import NODE_ADDRESS, NETWORK_NODES
+from CONSTANTS import SEND_QUEUE_SIZE, DEFAULT_PRIORITY, INGEST_POLL_TIME
+
+from header import MAX_MESSAGE_BITS, is_group
+
+
+##########################################################################################
+##########################################################################################
+
+def parse_message_line(line):
+    """
+    Parses a single '<message> <dest> [priority]' line into its binary representation.
+
+    Args:
+        line (str): A line in the messages.txt format, optionally followed by a priority
+                    (lower values are transmitted first).
+
+    Returns:
+        tuple: (priority, dest, message_bits) where dest is -1, the broadcast address, a
+               multicast group or another node in NETWORK_NODES, or None if the line is empty,
+               malformed or addressed to an unknown node or to this node itself.
+    """
+
+    fields = line.strip().split()
+    if len(fields) not in [2, 3]:
+        return None
+
+    message, dest = fields[0], fields[1]
+    if not message or len(message) > MAX_MESSAGE_BITS or any(bit not in '01' for bit in message):
+        return None
+
+    try:
+        priority = int(fields[2]) if len(fields) == 3 else DEFAULT_PRIORITY
+        dest_value = int(dest)
+    except ValueError:
+        return None
+
+    message_bits = [int(bit) for bit in message]
+
+    if dest_value != -1 and not (is_group(dest_value) or dest_value in NETWORK_NODES):
+        return None     # No node would acknowledge it, so the sender would retry forever
+
+    if dest_value == NODE_ADDRESS:
+        return None     # Nobody would acknowledge a frame sent to ourselves
+
+    return (priority, dest_value, message_bits)
+
+
+##########################################################################################
+##########################################################################################
+
+class SendQueue:
+    """
+    Bounded, priority-aware queue of (dest, message_bits) pairs waiting for the MAC.
+
+    Producers block in put() while the queue is full, which propagates backpressure to
+    whichever source is feeding the node (file tail, pipe writer or socket client).
+    Messages of equal priority are delivered in arrival order.
+    """
+
+    def __init__(self, maxsize=SEND_QUEUE_SIZE):
+        self._queue = queue.PriorityQueue(maxsize)
+        self._order = itertools.count()
+        self._closed = threading.Event()
+
+    def put(self, dest, message_bits, priority=DEFAULT_PRIORITY):
+        """Blocks until there is room in the queue, then enqueues the message."""
+
+        self._queue.put((priority, next(self._order), dest, message_bits))
+
+    def put_line(self, line):
+        """Parses and enqueues a messages.txt style line. Returns False if it was rejected."""
+
+        parsed = parse_message_line(line)
+        if parsed is None:
+            if line.strip():
+                print(f"INGEST | Ignoring invalid line: {line.strip()}")
+            return False
+
+        priority, dest, message_bits = parsed
+        self.put(dest, message_bits, priority)
+        return True
+
+    def get(self):
+        """
+        Blocks until a message is available.
+
+        Returns:
+            tuple: (dest, message_bits), or None once the queue is closed and drained.
+        """
+
+        while True:
+            try:
+                _, _, dest, message_bits = self._queue.get(timeout=INGEST_POLL_TIME)
+                return (dest, message_bits)
+            except queue.Empty:
+                if self._closed.is_set():
+                    return None
+
+    def close(self):
+        """Signals that no more messages will be produced."""
+
+        self._closed.set()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+##########################################################################################
+##########################################################################################
+
+def tail_file(file_path, send_queue, follow=True):
+    """
+    Feeds every line of a file into the send queue and keeps following it for appended lines.
+
+    When following, a file that is truncated (e.g. `> messages.txt`) is read again from its
+    start, and a file that is replaced by a new one at the same path is re-opened.
+
+    Args:
+        file_path (str): The message file to read.
+        send_queue (SendQueue): The queue to feed.
+        follow (bool): Keep waiting for new lines after reaching the end of the file.
+                       If False, the queue is closed once the file has been read.
+    """
+
+    check_ingest_path('file', file_path)
+
+    while True:
+        while not os.path.exists(file_path):
+            time.sleep(INGEST_POLL_TIME)
+
+        with open(file_path, 'r') as file:
+            partial = ''
+            while True:
+                line = file.readline()
+
+                if line.endswith('\n'):
+                    send_queue.put_line(partial + line)
+                    partial = ''
+
+                elif line:
+                    # Writer has not finished the line yet; keep it until the newline arrives
+                    partial += line
+
+                elif not follow:
+                    if partial:
+                        send_queue.put_line(partial)
+                    send_queue.close()
+                    return
+
+                elif file_changed(file_path, file):
+                    break       # Replaced or removed: re-open whatever is at the path next
+
+                elif os.fstat(file.fileno()).st_size < file.tell():
+                    file.seek(0)    # Truncated: the new content starts from the beginning
+                    partial = ''
+
+                else:
+                    time.sleep(INGEST_POLL_TIME)
+
+
+def file_changed(file_path, file):
+    """Returns True if file_path no longer refers to the open file."""
+
+    try:
+        current = os.stat(file_path)
+    except FileNotFoundError:
+        return True
+
+    opened = os.fstat(file.fileno())
+    return (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+
+
+def read_fifo(fifo_path, send_queue):
+    """
+    Feeds lines written to a named pipe into the send queue. The pipe is created if needed
+    and re-opened whenever the last writer closes it, so any number of programs can feed it.
+    """
+
+    if not check_ingest_path('fifo', fifo_path):
+        os.mkfifo(fifo_path)
+
+    while True:
+        # open() blocks until a writer connects to the pipe
+        with open(fifo_path, 'r') as fifo:
+            for line in fifo:
+                send_queue.put_line(line)
+
+
+def read_unix_socket(socket_path, send_queue):
+    """
+    Accepts connections on a local UNIX stream socket and feeds every received line into the
+    send queue. Each client is served by its own thread; while the queue is full the client
+    is not read from, so it blocks on its own send() instead of losing messages.
+    """
+
+    if check_ingest_path('socket', socket_path):
+        os.remove(socket_path)      # A stale socket left by a previous run
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+
+    def serve_client(conn):
+        with conn, conn.makefile('r') as stream:
+            for line in stream:
+                send_queue.put_line(line)
+
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=serve_client, args=(conn,), daemon=True).start()
+
+
+INGEST_SOURCES = {
+    'file': tail_file,
+    'fifo': read_fifo,
+    'socket': read_unix_socket,
+}
+
+INGEST_FILE_TYPES = {
+    'file': stat.S_ISREG,
+    'fifo': stat.S_ISFIFO,
+    'socket': stat.S_ISSOCK,
+}
+
+def check_ingest_path(mode, path):
+    """
+    Checks that whatever already exists at path is of the kind the ingest mode expects, so that
+    e.g. switching INGEST_MODE to 'socket' never removes or re-reads a regular messages file.
+
+    Returns:
+        bool: True if path exists (with the expected type), False if it does not exist.
+
+    Raises:
+        ValueError: If path exists but is not a regular file, named pipe or socket respectively.
+    """
+
+    try:
+        mode_bits = os.stat(path).st_mode
+    except FileNotFoundError:
+        return False
+
+    if not INGEST_FILE_TYPES[mode](mode_bits):
+        raise ValueError(f"INGEST_PATH {path} exists but is not usable in '{mode}' mode")
+
+    return True
+
+def start_ingest(mode, path, send_queue):
+    """
+    Starts the ingestion source for the given mode ('file', 'fifo' or 'socket') in a
+    background thread.
+
+    Returns:
+        threading.Thread: The started ingestion thread.
+    """
+
+    if mode not in INGEST_SOURCES:
+        raise ValueError(f"Unknown ingest mode: {mode}")
+
+    check_ingest_path(mode, path)   # Fail at startup rather than in the ingestion thread
+
+    thread = threading.Thread(target=INGEST_SOURCES[mode], args=(path, send_queue), daemon=True)
+    thread.start()
+    return thread
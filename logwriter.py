@@ -0,0 +1,84 @@
+import os
+import atexit
+import threading
+import queue
+
+from CONSTANTS import LOG_FLUSH_INTERVAL, LOG_MAX_BYTES, LOG_BACKUP_COUNT
+
+
+##########################################################################################
+##########################################################################################
+
+class LogWriter:
+    """
+    Appends lines to a log file from a background thread so the caller never waits on disk I/O.
+
+    Lines are batched and written every flush_interval seconds (or as soon as the thread wakes
+    up with pending lines), followed by flush() and fsync(). Once the file exceeds max_bytes
+    it is rotated to '<path>.1', '<path>.2', ... keeping at most backup_count old files.
+    """
+
+    def __init__(self, path, flush_interval=LOG_FLUSH_INTERVAL, max_bytes=LOG_MAX_BYTES,
+                 backup_count=LOG_BACKUP_COUNT):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self._lines = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+        atexit.register(self.close)
+
+    def write(self, line):
+        """Queues a line for writing. Never blocks on the file system."""
+
+        self._lines.put(line)
+
+    def close(self):
+        """Writes out all pending lines and stops the writer thread."""
+
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._lines.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write_batch(self, batch):
+        with open(self.path, 'a') as file:
+            file.write(''.join(batch))
+            file.flush()
+            os.fsync(file.fileno())
+            size = file.tell()
+
+        if self.max_bytes and size >= self.max_bytes:
+            self._rotate()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            batch = self._drain()
+            if batch:
+                self._write_batch(batch)
+
+        batch = self._drain()
+        if batch:
+            self._write_batch(batch)
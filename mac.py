@@ -0,0 +1,108 @@
+import random
+
+from CONSTANTS import CW_MAX, CW_MIN, SIFS, DIFS, SLOT_DURATION
+from CONSTANTS import SENDER_INIT_TIME
+
+
+##########################################################################################
+##########################################################################################
+
+def next_contention_window(contention_window, cw_min=CW_MIN, cw_max=CW_MAX):
+    """Doubles the contention window, resetting it to the minimum once it exceeds the maximum."""
+
+    contention_window *= 2
+
+    if contention_window > cw_max:
+        contention_window = cw_min  # Reset contention window if it exceeds maximum
+
+    return contention_window
+
+
+def csma_process(ack_delays, group, cw_min=CW_MIN, cw_max=CW_MAX, difs=DIFS, sifs=SIFS,
+                 slot_duration=SLOT_DURATION, rng=random, log=print):
+    """
+    The CSMA/CA decisions for transmitting one frame, independent of how the channel is accessed.
+
+    The generator yields the actions it needs performed and is sent back their results, so the
+    same logic drives the real audio node (Sender_n.csma_transmit) and the discrete-event
+    simulator (simulator.py). It returns once every expected ACK has been received.
+
+    Actions:
+        ('carrier_sense',)      -> bool: True if the channel is busy right now.
+        ('sense', t)            -> bool: True as soon as the channel is busy within t seconds.
+        ('sense_difs', t)       -> bool: Like 'sense', crediting time the channel was already idle.
+        ('wait_idle',)          -> None: Returns once the channel is idle.
+        ('transmit',)           -> bool: True if the frame was aborted on a detected collision,
+                                   False once it has been played completely.
+        ('receive_ack', node, t) -> bool: True if the ACK of the given node was received, listening
+                                   from t seconds after the end of the transmitted frame.
+
+    Args:
+        ack_delays (dict): Every node expected to acknowledge, in the order they send their ACKs,
+                           mapped to the time after the frame end at which it starts its ACK
+                           (header.ack_delay). An empty dict means no ACK is expected.
+        group (bool): True for broadcast/multicast frames, where ACKs arrive in scheduled slots.
+    """
+
+    contention_window = cw_min  # Start with the minimum contention window size
+
+    # ACK state of every node expected to acknowledge, in the order they send their ACKs
+    acked = {node: False for node in ack_delays}
+
+    # Continuously attempt to transmit the message until successful
+    while True:
+
+        'Step 1: Perform carrier sensing to check if the medium is free'
+        if (yield ('carrier_sense',)):
+            yield ('wait_idle',)
+            continue
+
+        'Step 2: If the medium is free, sense the medium for DIFS duration'
+        if (yield ('sense_difs', difs)):
+            continue    # If busy during DIFS, restart the process
+
+        'Step 3: Perform random backoff if medium is free after DIFS'
+        backoff_time_slots = rng.randint(0, contention_window)
+        log(f"DIFS-pass | Backoff Slots: {backoff_time_slots}")
+
+        # Count down the backoff time slots while continuously checking the medium
+        while backoff_time_slots > 0:
+            if not (yield ('sense', slot_duration)):
+                backoff_time_slots -= 1
+
+            else:
+                yield ('wait_idle',)    # Freeze the backoff while the medium is busy
+
+        log("[DIFS + SLOTS]-pass")
+
+        'Step 4: Sense the medium for SIFS (Short Inter-frame Space) duration before transmitting'
+        if (yield ('sense', sifs)):
+            contention_window = next_contention_window(contention_window, cw_min, cw_max)
+
+            log(f"MEDIUM BUSY | WHEN READY TO TRANSMIT | CW = {contention_window}")
+            continue    # Go back and retry
+
+        'Step 5: Transmit the frame'
+        if (yield ('transmit',)):
+            # Listen-while-talk detected a collision: skip the ACK wait and retry with a larger window
+            contention_window = next_contention_window(contention_window, cw_min, cw_max)
+
+            log(f"COLLISION DETECTED | TRANSMISSION ABORTED | CW = {contention_window}")
+            continue
+
+        'Step 6: Collect the acknowledgements'
+        # Every ACK slot is anchored to the end of the frame, so skipped or late slots never shift
+        # the ones after them. Listening starts SENDER_INIT_TIME before the ACK is due.
+        for node in acked:
+            if not acked[node]:
+                acked[node] = yield ('receive_ack', node, max(0, ack_delays[node] - SENDER_INIT_TIME))
+
+        if all(acked.values()):     # Check if all ACKs are received (trivially, if none is expected)
+            return
+
+        if not group:   # If single destination
+            log("ACK not recieved")
+
+        else:           # If broadcasting or multicasting
+            missing = [node for node in acked if not acked[node]]
+            log(f"ACK from {missing} not received")
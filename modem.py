@@ -0,0 +1,303 @@
+import argparse
+import numpy as np
+
+from CONSTANTS import sample_rate, volume, bit_duration
+from CONSTANTS import f_0, f_1, f_d, tolerance
+from CONSTANTS import MODULATION, PULSE_SHAPE, PULSE_ROLLOFF, GAUSSIAN_BT, DETECT_WINDOW
+
+
+WINDOWS = {}    # (name, length) -> cached detector window
+TONES = {}      # (frequency, duration) -> cached phase-reset tone
+
+##########################################################################################
+##########################################################################################
+
+def generate_tone(frequency, duration, sample_rate):
+    """
+    Generates a sine wave tone of a specified frequency and duration.
+
+    Args:
+        frequency (float): The frequency of the tone in Hertz.
+        duration (float): The duration of the tone in seconds.
+        sample_rate (int): The sample rate in samples per second, used for generating the tone.
+
+    Returns:
+        numpy.ndarray: A NumPy array containing the generated tone as a float32 data type.
+    """
+
+    t = np.linspace(0, duration, int(sample_rate * duration), False)
+    tone = np.sin(frequency * t * 2 * np.pi) * volume
+    return tone.astype(np.float32)
+
+
+def pulse_kernel(shape, symbol_samples, rolloff=PULSE_ROLLOFF, bt=GAUSSIAN_BT):
+    """
+    Returns the normalized smoothing kernel applied to the frequency trajectory.
+
+    Args:
+        shape (str): 'raised_cosine' for a raised-cosine transition spanning rolloff symbols,
+                     or 'gaussian' for GFSK with bandwidth-time product bt.
+        symbol_samples (int): Samples per symbol.
+    """
+
+    if shape == 'gaussian':
+        sigma = np.sqrt(np.log(2)) / (2 * np.pi * bt) * symbol_samples
+        n = np.arange(-int(3 * sigma), int(3 * sigma) + 1)
+        kernel = np.exp(-0.5 * (n / sigma) ** 2)
+
+    elif shape == 'raised_cosine':
+        # Convolving a frequency step with a Hann window gives a raised-cosine transition
+        kernel = np.hanning(max(int(rolloff * symbol_samples), 1) + 2)[1:-1]
+
+    else:
+        raise ValueError(f"Unknown pulse shape: {shape}")
+
+    return kernel / kernel.sum()
+
+
+def bits_to_symbols(bits):
+    """
+    Maps bits to their symbols: every bit tone (f_0 or f_1) is followed by a delimiter tone.
+
+    Returns:
+        tuple: (frequencies, durations) lists for render_signal.
+    """
+
+    frequencies = []
+    durations = []
+    for bit in bits:
+        if bit == 1:
+            frequencies.append(f_1)
+        else:
+            frequencies.append(f_0)
+
+        durations.append(bit_duration)
+        frequencies.append(f_d)
+        durations.append(bit_duration)
+
+    return frequencies, durations
+
+
+def render_signal(frequencies, durations, mode=MODULATION, shape=PULSE_SHAPE, out=None):
+    """
+    Renders a sequence of tones into one waveform.
+
+    Args:
+        frequencies (list): A list of frequencies in Hertz for each symbol.
+        durations (list): A list of durations in seconds corresponding to each frequency.
+        mode (str): 'tone' for independent sine bursts that start at phase zero, or 'cpfsk' for
+                    continuous-phase FSK whose frequency transitions are smoothed with `shape`.
+        out (numpy.ndarray): Optional float32 buffer to render into, reused between frames.
+                             A new array is allocated if it is too small.
+
+    Returns:
+        numpy.ndarray: The float32 waveform (a view of `out` when it was used).
+    """
+
+    total = sum(int(sample_rate * d) for d in durations)
+    if out is None or len(out) < total:
+        out = np.empty(total, dtype=np.float32)
+
+    if mode == 'tone':
+        # Every symbol restarts at phase zero, so identical symbols share one cached tone
+        pos = 0
+        for f, d in zip(frequencies, durations):
+            if (f, d) not in TONES:
+                TONES[(f, d)] = generate_tone(f, d, sample_rate)
+            tone = TONES[(f, d)]
+            out[pos:pos + len(tone)] = tone
+            pos += len(tone)
+
+        return out[:pos]
+
+    if mode != 'cpfsk':
+        raise ValueError(f"Unknown modulation: {mode}")
+
+    lengths = [int(sample_rate * d) for d in durations]
+    trajectory = np.repeat(np.asarray(frequencies, dtype=np.float64), lengths)
+
+    kernel = pulse_kernel(shape, min(lengths))
+    padded = np.pad(trajectory, len(kernel) // 2, mode='edge')
+    trajectory = np.convolve(padded, kernel, mode='valid')[:len(trajectory)]
+
+    # Integrating the frequency keeps the phase continuous across symbol boundaries
+    phase = 2 * np.pi * np.cumsum(trajectory) / sample_rate
+    signal = np.sin(phase) * volume
+
+    # Fade the burst in and out over half a symbol to avoid clicks at its edges
+    ramp = np.hanning(2 * (min(lengths) // 2))
+    half = len(ramp) // 2
+    signal[:half] *= ramp[:half]
+    signal[len(signal) - half:] *= ramp[half:]
+
+    out[:total] = signal
+    return out[:total]
+
+##########################################################################################
+##########################################################################################
+
+def detect_window(length, name=DETECT_WINDOW):
+    """Returns the (cached) window applied to each chunk before the FFT, or None."""
+
+    if name is None:
+        return None
+
+    if (name, length) not in WINDOWS:
+        windows = {'hann': np.hanning, 'hamming': np.hamming, 'blackman': np.blackman}
+        WINDOWS[(name, length)] = windows[name](length).astype(np.float32)
+
+    return WINDOWS[(name, length)]
+
+
+def detect_frequency(data, sample_rate, window=DETECT_WINDOW):
+    """
+    Detects the dominant frequency in an audio signal using the Fast Fourier Transform (FFT).
+
+    Args:
+        data (bytes or numpy.ndarray): Audio signal data, either raw int16 bytes or a view
+                                        into the capture ring buffer.
+        sample_rate (int): The sample rate of the audio signal in samples per second.
+        window (str): The window applied before the FFT to reduce leakage from symbol edges.
+
+    Returns:
+        float: The dominant frequency present in the audio signal.
+    """
+
+    if isinstance(data, bytes):
+        data = np.frombuffer(data, dtype=np.int16)
+
+    w = detect_window(len(data), window)
+    spectrum = np.abs(np.fft.rfft(data if w is None else data * w))
+
+    idx = np.argmax(spectrum[:len(data)//2])
+    peak_freq = idx * sample_rate / len(data)
+
+    return peak_freq
+
+
+def match_frequency(freq):
+    """
+    Matches a detected frequency to predefined frequencies (f_0, f_1, f_d) within a tolerance range.
+
+    Args:
+        freq (float): The detected frequency in Hertz to be matched.
+    """
+
+    if abs(freq - f_0) < tolerance:
+        return 0
+    elif abs(freq - f_1) < tolerance:
+        return 1
+    elif abs(freq - f_d) < tolerance:
+        return 'delimiter'
+    return -1
+
+##########################################################################################
+##########################################################################################
+
+def tone_plan(spacing, count=3, center=f_d):
+    """Returns count tones spaced by spacing Hertz around center, e.g. [f_0, f_d, f_1] for spacing 440."""
+
+    return [center + (k - (count - 1) / 2) * spacing for k in range(count)]
+
+
+def adjacent_leakage(tones, duration, mode, shape=PULSE_SHAPE, symbols=200, seed=0):
+    """
+    Measures how much power a tone plan leaks into the neighbouring tone bins.
+
+    Random symbols of the plan are rendered, and the power within a quarter spacing of an unused
+    neighbour tone (one spacing below the lowest and above the highest tone) is compared with the
+    average power in the bins of the plan's own tones. This is the power a denser plan would see
+    land on the next tone, so it is dominated by the symbol edges rather than by the tone spread.
+
+    Returns:
+        float: The leakage in dB relative to an in-plan tone (more negative is better).
+    """
+
+    rng = np.random.default_rng(seed)
+    signal = render_signal(list(rng.choice(tones, size=symbols)), [duration] * symbols, mode, shape)
+
+    power = np.abs(np.fft.rfft(signal)) ** 2
+    freqs = np.fft.rfftfreq(len(signal), 1 / sample_rate)
+    spacing = min(abs(a - b) for a in tones for b in tones if a != b)
+
+    def bin_power(tone):
+        return power[np.abs(freqs - tone) < spacing / 4].sum()
+
+    own = np.mean([bin_power(tone) for tone in tones])
+    neighbours = np.mean([bin_power(min(tones) - spacing), bin_power(max(tones) + spacing)])
+
+    return 10 * np.log10(neighbours / own + 1e-30)
+
+
+def symbol_error_rate(tones, duration, mode, shape=PULSE_SHAPE, window=DETECT_WINDOW, snr_db=10,
+                      symbols=2000, offset=0.0, seed=0):
+    """
+    Measures the symbol error rate of a tone plan over an additive white noise channel.
+
+    Random symbols are rendered, noise is added at snr_db, and each symbol-long chunk (shifted by
+    `offset` symbols to model an unsynchronized receiver, which should stay below 0.5 so the chunk
+    mostly covers one symbol) is decided as the nearest tone to the detected peak, or as an error
+    when it is more than half the tone spacing away.
+
+    Returns:
+        float: The fraction of symbols decided wrongly.
+    """
+
+    rng = np.random.default_rng(seed)
+    sent = rng.integers(len(tones), size=symbols)
+    signal = render_signal([tones[i] for i in sent], [duration] * symbols, mode, shape)
+
+    noise_power = np.mean(signal ** 2) / (10 ** (snr_db / 10))
+    received = signal + rng.normal(0, np.sqrt(noise_power), len(signal))
+    received = (received / np.abs(received).max() * 32767).astype(np.int16)
+
+    n = int(sample_rate * duration)
+    start = int(offset * n)
+    spacing = min(abs(a - b) for a in tones for b in tones if a != b)
+
+    errors = 0
+    decided = 0
+    for k in range(symbols - 1):
+        chunk = received[start + k * n:start + (k + 1) * n]
+        if len(chunk) < n:
+            break
+
+        freq = detect_frequency(chunk, sample_rate, window)
+        nearest = int(np.argmin([abs(freq - tone) for tone in tones]))
+        if nearest != sent[k] or abs(freq - tones[nearest]) > spacing / 2:
+            errors += 1
+        decided += 1
+
+    return errors / decided
+
+##########################################################################################
+##########################################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare adjacent tone leakage and symbol error rate of modulator modes.")
+    parser.add_argument('--spacings', type=float, nargs='+', default=[f_d - f_0, 100, 50, 25],
+                        help="Tone spacings in Hertz; the default plan [f_0, f_d, f_1] is spaced f_d - f_0")
+    parser.add_argument('--count', type=int, default=3, help="Tones per plan, centered on f_d")
+    parser.add_argument('--durations', type=float, nargs='+', default=[bit_duration, 0.05])
+    parser.add_argument('--snr', type=float, nargs='+', default=[-10, 0])
+    parser.add_argument('--offset', type=float, default=0.25, help="Receiver chunk offset in symbols")
+    parser.add_argument('--symbols', type=int, default=500)
+    args = parser.parse_args()
+
+    configs = [('tone', PULSE_SHAPE, None), ('tone', PULSE_SHAPE, 'hann'),
+               ('cpfsk', 'raised_cosine', 'hann'), ('cpfsk', 'gaussian', 'hann')]
+
+    print(f"{'mode':>8} {'shape':>14} {'window':>8} {'duration':>9} {'spacing':>8} {'ACL dB':>8} "
+          + ' '.join(f"{'SER@' + str(snr) + 'dB':>10}" for snr in args.snr))
+
+    for duration in args.durations:
+        for spacing in args.spacings:
+            tones = tone_plan(spacing, args.count)
+            for mode, shape, window in configs:
+                leakage = adjacent_leakage(tones, duration, mode, shape)
+
+                rates = [symbol_error_rate(tones, duration, mode, shape, window, snr, args.symbols, args.offset)
+                         for snr in args.snr]
+
+                print(f"{mode:>8} {shape if mode == 'cpfsk' else '-':>14} {str(window):>8} {duration:>9.3f} "
+                      f"{spacing:>8.0f} {leakage:>8.1f} " + ' '.join(f"{rate:>10.4f}" for rate in rates))
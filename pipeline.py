@@ -0,0 +1,98 @@
+import threading
+import queue
+import numpy as np
+
+from CONSTANTS import sample_rate, bit_duration, START_BITS, FRAGMENT_MTU, PIPELINE_DEPTH
+
+from header import HEADER_LENGTH
+from modem import bits_to_symbols, render_signal
+
+
+# Longest frame on air: start bits plus a full fragment with worst-case bit stuffing (one '1' per four bits)
+MAX_FRAME_BITS = len(START_BITS) + (HEADER_LENGTH + FRAGMENT_MTU) * 5 // 4 + 1
+MAX_FRAME_SAMPLES = 2 * MAX_FRAME_BITS * int(sample_rate * bit_duration)
+
+##########################################################################################
+##########################################################################################
+
+class PreparedFrame:
+    """A frame that is ready to be played: its symbols and rendered waveform."""
+
+    def __init__(self, dest, message, frag_index, last, fragments, frequencies, durations, signal, buffer):
+        self.dest = dest
+        self.message = message          # The whole message this fragment belongs to, for logging
+        self.frag_index = frag_index
+        self.last = last
+        self.fragments = fragments
+
+        self.frequencies = frequencies
+        self.durations = durations
+        self.signal = signal
+        self.bounds = np.cumsum([0] + [int(sample_rate * d) for d in durations])   # Symbol start samples
+
+        self.buffer = buffer
+
+
+class TransmitPipeline:
+    """
+    Prepares upcoming frames in a background worker while the MAC is busy with the current one.
+
+    The worker takes messages from the send queue, lets `build_frames` assign the counter and
+    build the stuffed bits of every fragment, maps them to symbols and renders the waveform into
+    one of depth + 1 preallocated buffers. Up to `depth` frames wait ready in order; the worker
+    blocks once all buffers are in use, until the MAC releases the frame it has finished with.
+
+    Args:
+        send_queue (SendQueue): The source of (dest, message_bits) pairs.
+        build_frames (callable): build_frames(dest, message) -> list of (frag_index, last, frame_bits)
+                                 for every fragment to transmit, in order (empty to skip the message).
+        depth (int): Number of frames prepared ahead.
+    """
+
+    def __init__(self, send_queue, build_frames, depth=PIPELINE_DEPTH):
+        self.send_queue = send_queue
+        self.build_frames = build_frames
+
+        self.buffers = queue.Queue()
+        for _ in range(depth + 1):
+            self.buffers.put(np.empty(MAX_FRAME_SAMPLES, dtype=np.float32))
+
+        self.ready = queue.Queue(depth)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def get(self):
+        """
+        Blocks until the next frame is ready.
+
+        Returns:
+            PreparedFrame: The next frame, or None once the send queue is closed and drained.
+        """
+
+        return self.ready.get()
+
+    def release(self, frame):
+        """Hands the frame's waveform buffer back to the worker once the frame is no longer played."""
+
+        self.buffers.put(frame.buffer)
+
+    def _run(self):
+        while True:
+            pair = self.send_queue.get()
+            if pair is None:
+                self.ready.put(None)
+                return
+
+            dest, message = pair
+            fragments = self.build_frames(dest, message)
+
+            for frag_index, last, frame_bits in fragments:
+                frequencies, durations = bits_to_symbols(frame_bits)
+
+                buffer = self.buffers.get()
+                signal = render_signal(frequencies, durations, out=buffer)
+
+                self.ready.put(PreparedFrame(dest, message, frag_index, last, len(fragments),
+                                             frequencies, durations, signal, buffer))
@@ -0,0 +1,462 @@
+import argparse
+import heapq
+import itertools
+import random
+
+from multiprocessing import Pool
+
+from CONSTANTS import bit_duration
+from CONSTANTS import CW_MAX, CW_MIN, SIFS, DIFS, SLOT_DURATION
+from CONSTANTS import RETURN_MESSAGE, START_BITS, ACK_REC_TIMEOUT
+from CONSTANTS import BROADCAST_ADDRESS, FRAGMENT_MTU
+from CONSTANTS import COLLISION_DETECT, CD_CONFIRM_CHUNKS, JAM_SYMBOLS
+
+from header import HEADER_LENGTH, recipients, ack_delay
+from mac import csma_process
+
+
+SYMBOL_TIME = 2 * bit_duration      # Every bit is a tone followed by a delimiter
+DETECT_DELAY = bit_duration         # One capture chunk passes before CCA reports a new carrier
+ACK_AIRTIME = len(RETURN_MESSAGE) * SYMBOL_TIME
+ACK_PREAMBLE_TIME = RETURN_MESSAGE.index(0) * SYMBOL_TIME   # The ACK decoder can lock on until its first '0'
+CD_DELAY = DETECT_DELAY + CD_CONFIRM_CHUNKS * bit_duration    # From collision start to abort
+JAM_AIRTIME = JAM_SYMBOLS * bit_duration
+
+##########################################################################################
+##########################################################################################
+
+class Transmission:
+    """A frame or ACK occupying the modeled channel between start and end."""
+
+    def __init__(self, src, kind, start, end):
+        self.src = src
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.visible = False
+        self.collided = False
+        self.aborted = False
+        self.lost = False           # An ACK dropped by the ack_loss model
+
+        # Only used for data frames
+        self.dest = None
+        self.ack_order = []
+        self.payload_bits = 0
+        self.message_id = None
+
+
+class SimNode:
+    """The sender side of one simulated node."""
+
+    def __init__(self, address, seed):
+        self.address = address
+        self.rng = random.Random(seed)
+
+        self.queue = []             # Arrival times of messages waiting for the MAC
+        self.mac = None
+        self.message_arrival = None
+        self.message_dest = None
+        self.message_id = 0
+
+        self.token = 0              # Invalidates scheduled wake-ups of a previous action
+        self.sensing = False
+        self.waiting_idle = False
+        self.frame_end = None
+        self.pending_acks = {}      # recipient -> start time of its scheduled ACK
+        self.ack_txs = {}           # recipient -> its ACK Transmission
+
+        self.latencies = []
+        self.delivered_bits = 0
+        self.frames_sent = 0
+
+
+class Simulation:
+    """
+    Discrete-event model of several nodes sharing the acoustic channel, with a virtual clock.
+
+    Each node runs the same mac.csma_process decisions as Sender_n.py. The channel model:
+    a transmission becomes audible to every node DETECT_DELAY after it starts, any two
+    overlapping transmissions are both lost, and each addressed node that received a data
+    frame cleanly plays its ACK after header.ack_delay(), without carrier sensing. With
+    collision_detect, a sender whose data frame collides aborts it CD_DELAY after the collision
+    started and plays JAM_AIRTIME of jam signal instead of the rest of the frame. Each ACK is
+    additionally lost with probability ack_loss, which models noise and exercises retransmissions
+    where only some recipients of a group frame have acknowledged.
+
+    Args:
+        node_count (int): Number of nodes, addressed 1..node_count.
+        params (dict): Keyword arguments for csma_process (cw_min, cw_max, difs, sifs, slot_duration).
+        payload_bits (int): Payload size of every message.
+        arrival_rate (float): Poisson message arrivals per node per second, or None for saturated nodes.
+        broadcast_fraction (float): Share of messages sent to BROADCAST_ADDRESS instead of one random node.
+        collision_detect (bool): Whether senders listen while talking and abort collided frames.
+        ack_loss (float): Probability that an ACK is not decoded by the sender.
+        duration (float): Simulated seconds.
+        seed (int): Seed for the traffic and backoff random generators.
+    """
+
+    def __init__(self, node_count, params, payload_bits=FRAGMENT_MTU, arrival_rate=None,
+                 broadcast_fraction=0.0, collision_detect=COLLISION_DETECT, ack_loss=0.0,
+                 duration=3600, seed=0):
+        self.params = params
+        self.payload_bits = payload_bits
+        self.arrival_rate = arrival_rate
+        self.broadcast_fraction = broadcast_fraction
+        self.collision_detect = collision_detect
+        self.ack_loss = ack_loss
+        self.duration = duration
+        self.rng = random.Random(seed)
+
+        self.addresses = list(range(1, node_count + 1))
+        self.nodes = {address: SimNode(address, self.rng.random()) for address in self.addresses}
+
+        self.now = 0.0
+        self.events = []
+        self.order = itertools.count()
+
+        self.active = []
+        self.last_transition = 0.0
+        self.data_frames = 0
+        self.collided_frames = 0
+        self.aborted_frames = 0
+
+    ######################################################################################
+
+    def schedule(self, t, fn, *args):
+        heapq.heappush(self.events, (t, next(self.order), fn, args))
+
+    def run(self):
+        """Runs the simulation for the configured duration and returns its statistics."""
+
+        for node in self.nodes.values():
+            if self.arrival_rate is None:
+                self.schedule(0.0, self.arrival, node)
+            else:
+                self.schedule(node.rng.expovariate(self.arrival_rate), self.arrival, node)
+
+        while self.events and self.events[0][0] <= self.duration:
+            t, _, fn, args = heapq.heappop(self.events)
+            self.now = t
+            fn(*args)
+
+        return self.stats()
+
+    ######################################################################################
+
+    def busy(self):
+        return any(tx.visible for tx in self.active)
+
+    def idle_time(self):
+        return 0 if self.busy() else self.now - self.last_transition
+
+    def start_tx(self, src, kind, airtime):
+        tx = Transmission(src, kind, self.now, self.now + airtime)
+
+        for other in self.active:
+            for victim in [other, tx]:
+                if self.collision_detect and victim.kind == 'data' and not victim.collided:
+                    self.schedule(self.now + CD_DELAY, self.abort_tx, victim)
+                victim.collided = True
+
+        self.active.append(tx)
+        self.schedule(tx.start + DETECT_DELAY, self.tx_visible, tx)
+        self.schedule(tx.end, self.end_tx, tx)
+        return tx
+
+    def tx_visible(self, tx):
+        if tx not in self.active:
+            return
+
+        if not self.busy():
+            self.last_transition = self.now
+        tx.visible = True
+
+        for node in self.nodes.values():
+            if node.sensing:
+                node.sensing = False
+                self.wake(node, True)
+
+    def abort_tx(self, tx):
+        """Cuts a collided data frame short with a jam signal and lets its sender retry."""
+
+        if tx not in self.active or tx.aborted or tx.end <= self.now + JAM_AIRTIME:
+            return
+
+        tx.aborted = True
+        tx.end = self.now + JAM_AIRTIME
+        self.aborted_frames += 1
+        self.schedule(tx.end, self.end_tx, tx)
+
+        sender = self.nodes[tx.src]
+        sender.token += 1
+        self.schedule(tx.end, self.resume_if, sender, sender.token, True)
+
+    def end_tx(self, tx):
+        if tx not in self.active or tx.end != self.now:
+            return      # Stale end event of an aborted frame
+
+        self.active.remove(tx)
+
+        if tx.visible and not self.busy():
+            self.last_transition = self.now
+            for node in self.nodes.values():
+                if node.waiting_idle:
+                    node.waiting_idle = False
+                    self.wake(node, None)
+
+        if tx.kind != 'data':
+            return
+
+        self.data_frames += 1
+        if tx.collided:
+            self.collided_frames += 1
+            return
+
+        sender = self.nodes[tx.src]
+        for r in tx.ack_order:
+            start = self.now + ack_delay(r, tx.src, tx.dest, self.addresses)
+            sender.pending_acks[r] = start
+            self.schedule(start, self.start_ack, r, sender)
+
+    def start_ack(self, r, sender):
+        tx = self.start_tx(r, 'ack', ACK_AIRTIME)
+        tx.lost = self.rng.random() < self.ack_loss
+        sender.ack_txs[r] = tx
+
+    ######################################################################################
+
+    def arrival(self, node):
+        node.queue.append(self.now)
+
+        if self.arrival_rate is not None:
+            self.schedule(self.now + node.rng.expovariate(self.arrival_rate), self.arrival, node)
+
+        if node.mac is None:
+            self.start_message(node)
+
+    def start_message(self, node):
+        node.message_arrival = node.queue.pop(0)
+        node.message_id += 1
+
+        if node.rng.random() < self.broadcast_fraction:
+            node.message_dest = BROADCAST_ADDRESS
+        else:
+            node.message_dest = node.rng.choice([a for a in self.addresses if a != node.address])
+
+        ack_delays = {r: ack_delay(r, node.address, node.message_dest, self.addresses)
+                      for r in recipients(node.address, node.message_dest, self.addresses)}
+        node.mac = csma_process(ack_delays, node.message_dest == BROADCAST_ADDRESS, rng=node.rng,
+                                log=lambda message: None, **self.params)
+        self.resume(node, None)
+
+    def complete(self, node):
+        node.mac = None
+        node.latencies.append(self.now - node.message_arrival)
+        node.delivered_bits += self.payload_bits
+
+        if self.arrival_rate is None:
+            node.queue.append(self.now)
+
+        if node.queue:
+            self.start_message(node)
+
+    ######################################################################################
+
+    def wake(self, node, value):
+        """Resumes the node's MAC with value at the current time, unless it has moved on."""
+
+        self.schedule(self.now, self.resume_if, node, node.token, value)
+
+    def resume_if(self, node, token, value):
+        if token == node.token:
+            self.resume(node, value)
+
+    def resume(self, node, value):
+        """Sends value into the node's MAC and performs the next action it yields."""
+
+        node.token += 1
+        node.sensing = False
+        node.waiting_idle = False
+
+        try:
+            action = node.mac.send(value)
+        except StopIteration:
+            self.complete(node)
+            return
+
+        token = node.token
+        if action[0] == 'carrier_sense':
+            self.wake(node, self.busy())
+
+        elif action[0] in ['sense', 'sense_difs']:
+            t = action[1]
+            if action[0] == 'sense_difs':
+                t = max(0, t - self.idle_time())   # Time the channel has already been idle counts towards DIFS
+
+            if self.busy():
+                self.wake(node, True)
+            else:
+                node.sensing = True
+                self.schedule(self.now + t, self.resume_if, node, token, False)
+
+        elif action[0] == 'wait_idle':
+            if self.busy():
+                node.waiting_idle = True
+            else:
+                self.wake(node, None)
+
+        elif action[0] == 'transmit':
+            frame_bits = len(START_BITS) + HEADER_LENGTH + self.payload_bits
+            tx = self.start_tx(node.address, 'data', frame_bits * SYMBOL_TIME)
+            tx.dest = node.message_dest
+            tx.ack_order = recipients(node.address, node.message_dest, self.addresses)
+            tx.payload_bits = self.payload_bits
+            tx.message_id = node.message_id
+
+            node.frames_sent += 1
+            node.frame_end = tx.end
+            node.pending_acks = {}
+            node.ack_txs = {}
+            self.schedule(tx.end, self.resume_if, node, token, False)
+
+        elif action[0] == 'receive_ack':
+            r, t = action[1], action[2]
+            listen = max(self.now, node.frame_end + t)
+            start = node.pending_acks.pop(r, None)
+
+            # Like Sender_n.decode_ack: the ACK is caught if listening starts before the end of its
+            # preamble and the ACK starts before the silence timeout expires
+            if start is not None and listen - ACK_PREAMBLE_TIME <= start <= listen + ACK_REC_TIMEOUT:
+                self.schedule(start + ACK_AIRTIME, self.ack_done, node, token, r)
+            else:
+                self.schedule(listen + ACK_REC_TIMEOUT, self.resume_if, node, token, False)
+
+    def ack_done(self, node, token, r):
+        tx = node.ack_txs.get(r)
+        self.resume_if(node, token, tx is not None and not tx.collided and not tx.lost)
+
+    ######################################################################################
+
+    def stats(self):
+        """Returns goodput, latency distribution and fairness of the finished run."""
+
+        latencies = sorted(l for node in self.nodes.values() for l in node.latencies)
+        per_node = [node.delivered_bits for node in self.nodes.values()]
+
+        if sum(per_node) > 0:
+            fairness = sum(per_node) ** 2 / (len(per_node) * sum(x * x for x in per_node))
+        else:
+            fairness = 0.0
+
+        return {
+            'messages': len(latencies),
+            'goodput_bps': sum(per_node) / self.duration,
+            'latency_mean': sum(latencies) / len(latencies) if latencies else None,
+            'latency_p50': percentile(latencies, 50),
+            'latency_p90': percentile(latencies, 90),
+            'latency_p99': percentile(latencies, 99),
+            'fairness': fairness,
+            'collision_rate': self.collided_frames / self.data_frames if self.data_frames else 0.0,
+            'aborted': self.aborted_frames,
+        }
+
+
+def percentile(sorted_values, q):
+    """Returns the q-th percentile of an already sorted list, or None if it is empty."""
+
+    if not sorted_values:
+        return None
+
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+##########################################################################################
+##########################################################################################
+
+def run_config(config):
+    """Runs one simulation from a configuration dict and returns the config merged with its statistics."""
+
+    params = {key: config[key] for key in ['cw_min', 'cw_max', 'difs', 'sifs', 'slot_duration']}
+    simulation = Simulation(config['nodes'], params, config['payload_bits'], config['arrival_rate'],
+                            config['broadcast_fraction'], config['collision_detect'], config['ack_loss'],
+                            config['duration'], config['seed'])
+
+    result = dict(config)
+    result.update(simulation.run())
+    return result
+
+
+def sweep(grid, processes=None):
+    """
+    Runs every combination of the parameter lists in grid, in parallel across processes.
+
+    Args:
+        grid (dict): Parameter name -> list of values, covering every key read by run_config.
+        processes (int): Number of worker processes (default: one per CPU).
+
+    Returns:
+        list: One result dict per combination.
+    """
+
+    keys = list(grid)
+    configs = [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+    with Pool(processes) as pool:
+        return pool.map(run_config, configs)
+
+
+def print_results(results):
+    columns = ['nodes', 'cw_min', 'cw_max', 'difs', 'sifs', 'slot_duration', 'payload_bits',
+               'arrival_rate', 'broadcast_fraction', 'collision_detect', 'ack_loss', 'seed',
+               'messages', 'goodput_bps', 'latency_mean', 'latency_p50', 'latency_p90', 'latency_p99',
+               'fairness', 'collision_rate', 'aborted']
+
+    print(' '.join(f"{column:>14}" for column in columns))
+    for result in results:
+        cells = []
+        for column in columns:
+            value = result[column]
+            cells.append(f"{value:>14.3f}" if isinstance(value, float) else f"{str(value):>14}")
+        print(' '.join(cells))
+
+##########################################################################################
+##########################################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweep CSMA/CA parameters on a simulated acoustic channel.")
+    parser.add_argument('--nodes', type=int, nargs='+', default=[3])
+    parser.add_argument('--cw-min', type=int, nargs='+', default=[CW_MIN])
+    parser.add_argument('--cw-max', type=int, nargs='+', default=[CW_MAX])
+    parser.add_argument('--difs', type=float, nargs='+', default=[DIFS])
+    parser.add_argument('--sifs', type=float, nargs='+', default=[SIFS])
+    parser.add_argument('--slot-duration', type=float, nargs='+', default=[SLOT_DURATION])
+    parser.add_argument('--payload-bits', type=int, nargs='+', default=[FRAGMENT_MTU])
+    parser.add_argument('--arrival-rate', type=float, nargs='+', default=[None],
+                        help="Messages per node per second (default: saturated nodes)")
+    parser.add_argument('--broadcast-fraction', type=float, nargs='+', default=[0.0])
+    parser.add_argument('--collision-detect', type=int, nargs='+', default=[int(COLLISION_DETECT)],
+                        help="1 to abort collided frames by listening while talking, 0 to play them out")
+    parser.add_argument('--ack-loss', type=float, nargs='+', default=[0.0],
+                        help="Probability that an ACK is lost to noise")
+    parser.add_argument('--duration', type=float, default=3600, help="Simulated seconds per run")
+    parser.add_argument('--seeds', type=int, default=1, help="Independent runs per combination")
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    grid = {
+        'nodes': args.nodes,
+        'cw_min': args.cw_min,
+        'cw_max': args.cw_max,
+        'difs': args.difs,
+        'sifs': args.sifs,
+        'slot_duration': args.slot_duration,
+        'payload_bits': args.payload_bits,
+        'arrival_rate': args.arrival_rate,
+        'broadcast_fraction': args.broadcast_fraction,
+        'collision_detect': [bool(value) for value in args.collision_detect],
+        'ack_loss': args.ack_loss,
+        'duration': [args.duration],
+        'seed': list(range(args.seeds)),
+    }
+
+    print_results(sweep(grid, args.processes))